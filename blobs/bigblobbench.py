@@ -0,0 +1,174 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""
+Benchmark comparing the standard and streaming BLOB send of sendbigblob.py
+
+For each mode, the sendbigblob.py driver is served in a child process, a
+client connects, enables BLOBs and receives one complete BLOB, checking its
+content against the file. The peak resident memory of the server process,
+and the time taken is then printed.
+
+By default a 1 GB test file of random bytes is created, and removed at the
+end, alternatively --size gives the size in MB, or --file an existing file.
+
+python bigblobbench.py --size 1024
+
+The peak memory is read from /proc, and so is only reported on Linux.
+"""
+
+
+import argparse, asyncio, hashlib, multiprocessing, os, re, time
+
+from base64 import standard_b64decode
+
+from datetime import datetime, timezone
+
+import sendbigblob
+from indipyserver import IPyServer
+from streamblob import StreamBLOBServer
+
+
+def runserver(blobpath, stream, port):
+    "Runs in the child process, serving the sendbigblob driver"
+    driver = sendbigblob.make_driver("bigblob", blobpath, stream=stream)
+    if stream:
+        server = StreamBLOBServer(driver, port=port)
+    else:
+        server = IPyServer(driver, port=port)
+    asyncio.run(server.asyncrun())
+
+
+def peak_rss(pid):
+    "Return the VmHWM of the process in kB, or None if unavailable"
+    try:
+        with open(f"/proc/{pid}/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+
+
+def make_testfile(filepath, size):
+    "Creates a file of size MB of random bytes"
+    with open(filepath, "wb") as fp:
+        for mb in range(size):
+            fp.write(os.urandom(1048576))
+
+
+def file_digest(filepath):
+    "Returns the sha256 hex digest of the file"
+    hasher = hashlib.sha256()
+    with open(filepath, "rb") as fp:
+        while chunk := fp.read(1048576):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+_TIMESTAMP = re.compile(rb'timestamp="([^"]+)"')
+
+
+async def receive_blob(port):
+    """Connects, enables BLOBs, and receives one BLOB, decoding it as it arrives.
+       Returns (number of bytes, sha256 hex digest, transfer seconds, seconds since the driver sent it)"""
+    reader, writer = await asyncio.open_connection("localhost", port)
+    writer.write(b'<getProperties version="1.7" /><enableBLOB device="bigblob">Also</enableBLOB>')
+    await writer.drain()
+    try:
+        buf = b""
+        # wait for the start of a setBLOBVector and its oneBLOB member
+        while True:
+            data = await reader.read(1048576)
+            if not data:
+                raise ConnectionError("Connection closed")
+            buf += data
+            setstart = buf.find(b"<setBLOBVector")
+            if setstart == -1:
+                buf = buf[-32:]
+                continue
+            blobstart = buf.find(b"<oneBLOB", setstart)
+            if blobstart == -1:
+                continue
+            tagend = buf.find(b">", blobstart)
+            if tagend == -1:
+                continue
+            start = time.perf_counter()
+            match = _TIMESTAMP.search(buf, setstart, blobstart)
+            sent = datetime.fromisoformat(match.group(1).decode())
+            buf = buf[tagend+1:]
+            break
+        # decode base64 content until the closing tag
+        hasher = hashlib.sha256()
+        nbytes = 0
+        carry = b""
+        while True:
+            lt = buf.find(b"<")
+            content = carry + (buf if lt == -1 else buf[:lt])
+            usable = len(content) - len(content) % 4
+            decoded = standard_b64decode(content[:usable])
+            hasher.update(decoded)
+            nbytes += len(decoded)
+            carry = content[usable:]
+            if lt != -1:
+                break
+            buf = await reader.read(1048576)
+            if not buf:
+                raise ConnectionError("Connection closed")
+        end = time.perf_counter()
+        since_sent = (datetime.now(tz=timezone.utc).replace(tzinfo=None) - sent).total_seconds()
+        return nbytes, hasher.hexdigest(), end - start, since_sent
+    finally:
+        writer.close()
+
+
+def runmode(blobpath, stream, port, digest):
+    "Runs the server for the given mode, receives a BLOB and prints the results"
+    name = "streaming" if stream else "standard"
+    serverprocess = multiprocessing.Process(target=runserver, args=(blobpath, stream, port), daemon=True)
+    serverprocess.start()
+    try:
+        time.sleep(1)
+        nbytes, rxdigest, transfer, since_sent = asyncio.run(receive_blob(port))
+        peak = peak_rss(serverprocess.pid)
+    finally:
+        serverprocess.terminate()
+        serverprocess.join()
+    mb = nbytes / 1048576
+    print(f"{name}: received {mb:.1f} MB, content {'correct' if rxdigest == digest else 'INCORRECT'}")
+    print(f"    transfer {transfer:.2f}s, {mb/transfer:.1f} MB/s, total since driver sent {since_sent:.2f}s, {mb/since_sent:.1f} MB/s")
+    if peak is None:
+        print("    server peak RSS unavailable")
+    else:
+        print(f"    server peak RSS {peak/1024:.1f} MB")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare standard and streaming BLOB transmission")
+    parser.add_argument("--size", type=int, default=1024, help="Size in MB of the test file to create, default 1024")
+    parser.add_argument("--file", help="Use this existing file rather than creating a test file")
+    parser.add_argument("--port", type=int, default=7624, help="Port of the server, default 7624")
+    args = parser.parse_args()
+
+    if args.file:
+        blobpath = args.file
+    else:
+        blobpath = "bigblob_test.bin"
+        print(f"Creating {args.size} MB test file {blobpath}")
+        make_testfile(blobpath, args.size)
+
+    print(f"Running {__file__}")
+    try:
+        digest = file_digest(blobpath)
+        runmode(blobpath, False, args.port, digest)
+        runmode(blobpath, True, args.port, digest)
+    finally:
+        if not args.file:
+            os.remove(blobpath)
@@ -9,9 +9,17 @@
 
 """
 Illustrates a driver receiving a file and saving it
+
+If a folder is given on the command line, for example
+
+python getblob.py /tmp
+
+the StreamBLOBServer from streamblob.py is used, and the received BLOB is
+decoded as it arrives and written to a temporary file in that folder, which
+is then moved to its final name, so the BLOB is never held in memory.
 """
 
-import asyncio
+import asyncio, shutil, sys
 
 # import logging, sys
 # logger = logging.getLogger()
@@ -23,6 +31,8 @@ import indipydriver as ipd
 
 from indipyserver import IPyServer
 
+from streamblob import StreamBLOBVector, StreamBLOBServer
+
 
 class _GetBLOBDriver(ipd.IPyDriver):
 
@@ -48,28 +58,38 @@ class _GetBLOBDriver(ipd.IPyDriver):
                     filename = "blobfile"
                 if memberformat:
                     filename = filename + memberformat
-                # write this to a file
-                with open(filename, "wb") as fp:
-                    # Write bytes to file
-                    fp.write(blobvalue)
+                if isinstance(blobvalue, bytes):
+                    # write this to a file
+                    with open(filename, "wb") as fp:
+                        # Write bytes to file
+                        fp.write(blobvalue)
+                else:
+                    # blobvalue is the path of a file the server has written, move it
+                    shutil.move(blobvalue, filename)
                 # send vector back to the client but with no members, this just
                 # sets the state to ok to inform the client it has been received
                 await event.vector.send_setVectorMembers(state="Ok", message=f"Saved as {filename}")
 
 
-def make_driver(devicename):
-    "Creates the driver"
+def make_driver(devicename, stream=False):
+    """Creates the driver, if stream is True the vector will be a StreamBLOBVector
+       able to receive BLOBs written to files by a StreamBLOBServer"""
+
+    if stream:
+        vectorclass = StreamBLOBVector
+    else:
+        vectorclass = ipd.BLOBVector
 
     # create member
     getmember = ipd.BLOBMember( name="getmember",
                                 label="BLOB file" )
     # set this member into a vector
-    getvector = ipd.BLOBVector( name="getvector",
-                                label="BLOB",
-                                group="File",
-                                perm="wo",         # Informs client it is writing a BLOB
-                                state="Ok",
-                                blobmembers=[getmember] )
+    getvector = vectorclass( name="getvector",
+                             label="BLOB",
+                             group="File",
+                             perm="wo",         # Informs client it is writing a BLOB
+                             state="Ok",
+                             blobmembers=[getmember] )
     # create a Device with this vector
     getblob = ipd.Device( devicename=devicename, properties=[getvector])
 
@@ -82,7 +102,12 @@ def make_driver(devicename):
 
 if __name__ == "__main__":
 
-    driver = make_driver("getblob")
-    server = IPyServer(driver)
+    if len(sys.argv) > 1:
+        # received BLOBs are written to files in this folder as they arrive
+        driver = make_driver("getblob", stream=True)
+        server = StreamBLOBServer(driver, rxblobfolder=sys.argv[1])
+    else:
+        driver = make_driver("getblob")
+        server = IPyServer(driver)
     print(f"Running {__file__} with indipydriver version {ipd.version}")
     asyncio.run(server.asyncrun())
@@ -8,9 +8,17 @@
 
 """
 Illustrates a driver receiving six files and saving them
+
+If a folder is given on the command line, for example
+
+python multiblobs.py /tmp
+
+the StreamBLOBServer from streamblob.py is used, and each received BLOB is
+decoded as it arrives and written to a temporary file in that folder, which
+is then moved to its final name, so the BLOBs are never held in memory.
 """
 
-import asyncio
+import asyncio, shutil
 
 import logging, sys
 logger = logging.getLogger()
@@ -22,6 +30,8 @@ import indipydriver as ipd
 
 from indipyserver import IPyServer
 
+from streamblob import StreamBLOBVector, StreamBLOBServer
+
 
 class _GetBLOBs(ipd.IPyDriver):
 
@@ -47,17 +57,27 @@ class _GetBLOBs(ipd.IPyDriver):
                     membersize, memberformat = event.sizeformat[membername]
                     if memberformat:
                         filename += memberformat
-                    # write blobvalue to a file with this name
-                    with open(filename, "wb") as fp:
-                        # Write bytes to file
-                        fp.write(blobvalue)
+                    if isinstance(blobvalue, bytes):
+                        # write blobvalue to a file with this name
+                        with open(filename, "wb") as fp:
+                            # Write bytes to file
+                            fp.write(blobvalue)
+                    else:
+                        # blobvalue is the path of a file the server has written, move it
+                        shutil.move(blobvalue, filename)
                 # send vector back to the client but with no members, this just
                 # sets the state to ok to inform the client the vector has been received
                 await event.vector.send_setVectorMembers(state="Ok", message=f"Saved {timestamp}")
 
 
-def make_driver(devicename):
-    "Creates the driver"
+def make_driver(devicename, stream=False):
+    """Creates the driver, if stream is True the vector will be a StreamBLOBVector
+       able to receive BLOBs written to files by a StreamBLOBServer"""
+
+    if stream:
+        vectorclass = StreamBLOBVector
+    else:
+        vectorclass = ipd.BLOBVector
 
     # create members
     members = []
@@ -65,12 +85,12 @@ def make_driver(devicename):
         members.append( ipd.BLOBMember(name=f"member{m}",
                                        label=f"BLOB file {m}") )
     # set these members into a vector
-    blobvector = ipd.BLOBVector( name="blobvector",
-                                 label="BLOB files",
-                                 group="Files",
-                                 perm="wo",         # Informs client it is writing BLOBs
-                                 state="Ok",
-                                 blobmembers=members )
+    blobvector = vectorclass( name="blobvector",
+                              label="BLOB files",
+                              group="Files",
+                              perm="wo",         # Informs client it is writing BLOBs
+                              state="Ok",
+                              blobmembers=members )
     # create a Device with this vector
     blobdevice = ipd.Device( devicename=devicename, properties=[blobvector] )
 
@@ -81,7 +101,12 @@ def make_driver(devicename):
 
 if __name__ == "__main__":
 
-    driver = make_driver("blobdevice")
-    server = IPyServer(driver)
+    if len(sys.argv) > 1:
+        # received BLOBs are written to files in this folder as they arrive
+        driver = make_driver("blobdevice", stream=True)
+        server = StreamBLOBServer(driver, rxblobfolder=sys.argv[1])
+    else:
+        driver = make_driver("blobdevice")
+        server = IPyServer(driver)
     print(f"Running {__file__} with indipydriver version {ipd.version}")
     asyncio.run(server.asyncrun())
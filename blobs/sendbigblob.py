@@ -10,6 +10,10 @@
 """
 Requires a BLOB filepath to be provided. Attempts to send it
 and waits 10 seconds then sends it again. This is to test how the client reacts
+
+If streaming is chosen, the StreamBLOBVector and StreamBLOBServer classes from
+streamblob.py are used, and the file is read and sent in chunks, so memory use
+remains bounded regardless of the file size.
 """
 
 
@@ -25,6 +29,8 @@ import indipydriver as ipd
 
 from indipyserver import IPyServer
 
+from streamblob import StreamBLOBVector, StreamBLOBServer
+
 class _BigBlobDriver(ipd.IPyDriver):
 
     """IPyDriver is subclassed here to create a driver for the instrument"""
@@ -46,18 +52,25 @@ class _BigBlobDriver(ipd.IPyDriver):
             await asyncio.sleep(10)
 
 
-def make_driver(devicename, blobpath):
-    "Returns an instance of the driver, blobpath is path to file"
+def make_driver(devicename, blobpath, stream=False):
+    """Returns an instance of the driver, blobpath is path to file
+       If stream is True, the blobvector will be a StreamBLOBVector, which
+       should be served by a StreamBLOBServer"""
+
+    if stream:
+        vectorclass = StreamBLOBVector
+    else:
+        vectorclass = ipd.BLOBVector
 
     # create blobvector, there is no member value to set at this point
     blobmember = ipd.BLOBMember( name="blobmember",
                                  label="BigBlob")
-    blobvector = ipd.BLOBVector( name="blobvector",
-                                 label="BigBlob",
-                                 group="File",
-                                 perm="ro",
-                                 state="Ok",
-                                 blobmembers=[blobmember] )
+    blobvector = vectorclass( name="blobvector",
+                              label="BigBlob",
+                              group="File",
+                              perm="ro",
+                              state="Ok",
+                              blobmembers=[blobmember] )
 
     # create a device with this vector
     bigblob = ipd.Device( devicename=devicename,
@@ -80,8 +93,13 @@ if __name__ == "__main__":
     while not blobpath:
         blobpath = input("Type in a blob file path:")
 
-    driver = make_driver("bigblob", blobpath)
-    server = IPyServer(driver)
+    stream = input("Stream the file in chunks? y/n:")
+    if stream == "y" or stream == "Y":
+        driver = make_driver("bigblob", blobpath, stream=True)
+        server = StreamBLOBServer(driver)
+    else:
+        driver = make_driver("bigblob", blobpath)
+        server = IPyServer(driver)
     # and run the server
     print(f"Running {__file__} with indipydriver version {ipd.version}")
     asyncio.run( server.asyncrun() )
@@ -0,0 +1,652 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""
+Streaming BLOB transmission from file paths.
+
+Normally a BLOBVector member set to a file path is read in full, base64
+encoded in full, and the whole XML message is then written to each client,
+so a multi-hundred MB file is held in memory several times over.
+
+This module provides:
+
+StreamBLOBVector - used in place of ipd.BLOBVector, when a member value is
+a path to a file, the file is not read when send_setVectorMembers is called,
+instead a FileBLOB element is created which only records the path.
+
+StreamBLOBServer - used in place of IPyServer, its client connections
+recognise FileBLOB elements and read the file in fixed size chunks,
+base64 encoding each chunk and writing it to the client as it goes,
+so memory used stays bounded regardless of the file size.
+
+If StreamBLOBServer is given an rxblobfolder, BLOBs received from clients
+in a newBLOBVector for an enabled StreamBLOBVector of one of its running
+drivers are decoded incrementally as they arrive, and written straight to
+a file in that folder. The element, with FileBLOB members, is passed only
+to that driver, not to other clients, remotes or external drivers, and the
+StreamBLOBVector then creates a newBLOBFileVector event, in which each
+member value is the pathlib.Path of the received file rather than bytes.
+The driver rxevent should move or delete the file. If no event is created,
+because the vector or device has been disabled, the driver is stopping,
+or the message is invalid, the file is deleted, as it is if the content
+is not valid base64, or the message fails to parse.
+
+A newBLOBVector for any other vector, such as an ipd.BLOBVector, or a vector
+of a remote or external driver, is not written to a file, but is received
+as IPyServer would, in memory.
+
+If a FileBLOB sent by a driver is passed anywhere else, such as to a remote
+connection or a snooping driver, its text is read and encoded in full, as
+before.
+
+Run this to serve a file given on the command line, for example
+
+python streamblob.py /path/to/bigfile.fits
+"""
+
+
+import asyncio, binascii, logging, os, pathlib, re, sys, tempfile
+
+from base64 import standard_b64encode, standard_b64decode
+
+from xml.sax.saxutils import quoteattr
+
+import xml.etree.ElementTree as ET
+
+import indipydriver as ipd
+
+from indipydriver.propertyvectors import timestamp_string
+
+from indipydriver.events import newVector, EventException
+
+from indipyserver import IPyServer
+
+# _ClientConnection is not part of the public indipyserver API, it is
+# subclassed here to change how data is written to each client
+from indipyserver.ipyserver import _ClientConnection
+
+logger = logging.getLogger(__name__)
+
+
+def _makestart(element):
+    "Given an xml element, returns bytes of its start, including < tag attributes >"
+    attriblist = ["<", element.tag]
+    for key,value in element.attrib.items():
+        attriblist.append(f" {key}={quoteattr(value)}")
+    attriblist.append(">")
+    return "".join(attriblist).encode()
+
+
+def _openquote(tag):
+    """Given bytes of the start of an element, returns True if it ends within
+       a quoted attribute value, so a > read is not the end of the tag"""
+    quote = None
+    for char in tag:
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in b"\"'":
+            quote = char
+    return quote is not None
+
+
+def _removefiles(root):
+    "Deletes the files of any FileBLOB members of root"
+    for member in root:
+        if isinstance(member, FileBLOB):
+            try:
+                member.filepath.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class FileBLOB(ET.Element):
+    """A oneBLOB element which holds the path to a file rather than its
+       base64 encoded content. The text attribute is only created if it is
+       requested, so a StreamBLOBServer client connection can stream
+       the file instead."""
+
+    def __init__(self, filepath, attrib):
+        super().__init__("oneBLOB", attrib)
+        self.filepath = filepath
+
+    @property
+    def text(self):
+        "The full base64 content, read from the file, used if the element is not streamed"
+        with open(self.filepath, "rb") as fp:
+            return standard_b64encode(fp.read()).decode("ascii")
+
+    async def b64chunks(self, chunksize):
+        """Async generator reading the file in chunks of chunksize bytes, which should
+           be a multiple of three, and yielding each chunk base64 encoded"""
+        loop = asyncio.get_running_loop()
+        with open(self.filepath, "rb") as fp:
+            while True:
+                chunk = await loop.run_in_executor(None, fp.read, chunksize)
+                if not chunk:
+                    break
+                yield standard_b64encode(chunk)
+
+
+class newBLOBFileVector(ipd.newBLOBVector):
+    """An event indicating a newBLOBVector has been received, this is a mapping
+       of membername:value, where each value is the pathlib.Path of a file holding
+       the received BLOB, or bytes if the member was not written to a file.
+
+       As ipd.newBLOBVector it contains a further attribute 'sizeformat' which is
+       a dictionary of membername:(membersize, memberformat)"""
+
+    def __init__(self, devicename, vectorname, vector, root):
+        newVector.__init__(self, devicename, vectorname, vector, root)
+        self.sizeformat = {}
+        for member in root:
+            if member.tag != "oneBLOB":
+                raise EventException("Received tag not known for newBLOBVector")
+            membername = member.get("name")
+            if not membername:
+                raise EventException("No member name set in oneBLOB")
+            if membername not in self.vector:
+                raise EventException("Received tag not known for newBLOBVector")
+            try:
+                if isinstance(member, FileBLOB):
+                    self.data[membername] = member.filepath
+                else:
+                    self.data[membername] = standard_b64decode(member.text.encode('ascii'))
+                membersize = int(member.get("size"))
+            except Exception:
+                raise EventException("Unable to decode BLOB")
+            memberformat = member.get("format")
+            if not memberformat:
+                logger.warning("No format received in oneBLOB member of newBLOBVector")
+                memberformat = ""
+            self.sizeformat[membername] = (membersize, memberformat)
+        if not self.data:
+            raise EventException("No contents received for newBLOBVector")
+
+
+class StreamBLOBVector(ipd.BLOBVector):
+
+    """A BLOBVector where any member set to a file path, either a string or a pathlib.Path,
+       is sent as a FileBLOB, and is not read until it is transmitted to a client.
+       Members set to bytes or file-like objects are sent as normal.
+
+       As the file is read at transmission, it should not be altered until
+       the transmission is complete.
+
+       If a newBLOBVector is received with members already written to files
+       by a StreamBLOBServer, a newBLOBFileVector event is created."""
+
+    def create_event(self, root):
+        if (root.tag == "newBLOBVector") and any(isinstance(member, FileBLOB) for member in root):
+            # if no event is created, nothing else will delete the received files
+            if not self.enable:
+                _removefiles(root)
+                return
+            try:
+                return newBLOBFileVector(self.devicename, self.name, self, root)
+            except EventException:
+                logger.exception("Unable to create event from received data")
+                _removefiles(root)
+                return
+        if not self.enable:
+            return
+        return super().create_event(root)
+
+    async def send_setVectorMembers(self, message='', timestamp=None, timeout=None, state=None, members=[]):
+        """members is a list of member names.
+
+           Transmits the vector (setBLOBVector) and members with their values to the client.
+           As ipd.BLOBVector, but members holding a path to a file are sent as FileBLOB elements.
+        """
+        if timeout is not None:
+            self.timeout = timeout
+        self.message = message
+        if state:
+            if state in ('Idle','Ok','Busy','Alert'):
+                if state != self._state:
+                    self._state = state
+                    self.changed = True
+            else:
+                logger.error("Aborting sending setBLOBVector: The given state must be either None or one of Idle, Ok, Busy or Alert")
+                return
+        if not self.device.enable:
+            return
+        if not self.enable:
+            return
+        tstring = timestamp_string(timestamp)
+        if not tstring:
+            logger.error("Aborting sending setBLOBVector: The given send_setVectorMembers timestamp must be a UTC datetime.datetime object")
+            return
+        xmldata = ET.Element('setBLOBVector')
+        xmldata.set("device", self.devicename)
+        xmldata.set("name", self.name)
+        xmldata.set("state", self.state)
+        xmldata.set("timestamp", tstring)
+        if self._perm != 'ro':
+            xmldata.set("timeout", self._timeout)
+        if self.message:
+            xmldata.set("message", self.message)
+
+        loop = asyncio.get_running_loop()
+
+        for blob in self.data.values():
+            if (blob.name not in members) or (blob.membervalue is None):
+                continue
+            value = blob.membervalue
+            if isinstance(value, (str, pathlib.Path)):
+                filepath = pathlib.Path(value)
+                try:
+                    filesize = filepath.stat().st_size
+                except OSError:
+                    logger.exception("Unable to create setBLOBVector")
+                    continue
+                if not filesize:
+                    logger.error("Unable to create setBLOBVector, the BLOB file is empty")
+                    continue
+                blobformat = blob.blobformat or "".join(filepath.suffixes)
+                # blob.blobsize, if set, is the size prior to any compression
+                xmldata.append( FileBLOB(filepath, {"name":blob.name,
+                                                    "format":blobformat,
+                                                    "size":str(blob.blobsize or filesize)}) )
+            else:
+                try:
+                    bytescontent = await loop.run_in_executor(None, blob.getbytes, value)
+                    xmldata.append(blob.oneblob(bytescontent))
+                except ValueError:
+                    logger.exception("Unable to create setBLOBVector")
+        await self.driver.send(xmldata)
+        self.changed = False
+
+
+class _SpoolReader:
+
+    """Wraps the asyncio.StreamReader of a client connection. When the start tag of
+       a oneBLOB within a newBLOBVector is read, the base64 content following it
+       is decoded a chunk at a time and written to a new file in folder. The content
+       is not passed on, instead a spoolfile attribute giving the file path is added
+       to the start tag, so the message parsed by the connection is small.
+
+       Only a newBLOBVector for which streamdriver(devicename, vectorname) returns
+       a driver is spooled, others are passed on unchanged."""
+
+    def __init__(self, reader, folder, chunksize, streamdriver):
+        self.reader = reader
+        self.folder = folder
+        self.chunksize = chunksize
+        self.streamdriver = streamdriver
+        # data read from reader, but not yet returned
+        self._pending = b""
+        # True while the parts of a newBLOBVector being spooled are read
+        self._inblobvector = False
+        # paths of files created for the message being read, checked when
+        # the spoolfile attribute is read, and any left are removed by discard
+        self.spooled = set()
+
+
+    async def readuntil(self, separator=b'>'):
+        "As StreamReader.readuntil, but spools oneBLOB content of a newBLOBVector to a file"
+        data = await self._readpart(separator)
+        start = max(data.rfind(b"<newBLOBVector"), data.rfind(b"<oneBLOB"))
+        if start == -1:
+            if b"</newBLOBVector>" in data:
+                self._inblobvector = False
+            return data
+
+        # a > within an attribute value does not end the tag
+        while _openquote(data[start:]):
+            try:
+                data += await self._readpart(separator)
+            except Exception:
+                # return data to pending, for the caller to read
+                self._pending = data + self._pending
+                raise
+        tag = data[start:]
+
+        if tag.startswith(b"<newBLOBVector"):
+            self._inblobvector = (not tag.endswith(b"/>")) and self._isspooltarget(tag)
+        elif self._inblobvector and not tag.endswith(b"/>"):
+            # data ends with a oneBLOB start tag, so its content follows
+            if re.search(rb"\sspoolfile\s*=", tag):
+                # only this reader may set the attribute, so the content is not
+                # spooled, and filebloblist removes the attribute
+                logger.warning("spoolfile attribute received in oneBLOB, BLOB not written to a file")
+                return data
+            filepath = await self._spool()
+            data = data[:-1] + f" spoolfile={quoteattr(str(filepath))}>".encode()
+        return data
+
+
+    def _isspooltarget(self, tag):
+        "Given bytes of a newBLOBVector start tag, returns True if its BLOBs should be spooled"
+        try:
+            element = ET.fromstring(tag[:-1].rstrip(b"/") + b"/>")
+        except ET.ParseError:
+            return False
+        return self.streamdriver(element.get("device"), element.get("name")) is not None
+
+
+    async def _readpart(self, separator):
+        "Returns data up to and including separator, from any pending data, then the reader"
+        if self._pending:
+            data = self._pending
+            self._pending = b""
+            index = data.find(separator)
+            if index != -1:
+                self._pending = data[index+len(separator):]
+                data = data[:index+len(separator)]
+            else:
+                try:
+                    data += await self.reader.readuntil(separator)
+                except Exception:
+                    # return data to pending, for the caller to read
+                    self._pending = data
+                    raise
+        else:
+            data = await self.reader.readuntil(separator)
+        return data
+
+
+    async def read(self, n=-1):
+        "As StreamReader.read"
+        if self._pending:
+            data = self._pending
+            self._pending = b""
+            return data
+        return await self.reader.read(n)
+
+
+    async def _spool(self):
+        "Decode base64 content up to the next < and write it to a new file, return the file path"
+        fd, filename = tempfile.mkstemp(dir=self.folder, prefix="blob_")
+        filepath = pathlib.Path(filename)
+        self.spooled.add(filepath)
+        try:
+            await self._decodeto(fd)
+        except binascii.Error:
+            self._remove(filepath)
+            raise ConnectionError("Invalid base64 content received in oneBLOB")
+        except BaseException:
+            self._remove(filepath)
+            raise
+        return filepath
+
+
+    async def _decodeto(self, fd):
+        "Decode base64 content up to the next < and write it to the open file descriptor fd"
+        loop = asyncio.get_running_loop()
+        carry = b""
+        with os.fdopen(fd, "wb") as fp:
+            while True:
+                if self._pending:
+                    data = self._pending
+                    self._pending = b""
+                else:
+                    data = await self.reader.read(self.chunksize)
+                    if not data:
+                        raise ConnectionError("Connection closed during BLOB content")
+                lt = data.find(b"<")
+                if lt != -1:
+                    # end of content reached, keep the remainder for readuntil
+                    self._pending = data[lt:]
+                    data = data[:lt]
+                # remove any whitespace, and decode complete groups of four characters
+                data = carry + b"".join(data.split())
+                if lt == -1:
+                    usable = len(data) - len(data) % 4
+                else:
+                    usable = len(data)
+                carry = data[usable:]
+                if usable:
+                    await loop.run_in_executor(None, fp.write, standard_b64decode(data[:usable]))
+                if lt != -1:
+                    break
+
+
+    def _remove(self, filepath):
+        "Delete a spooled file"
+        self.spooled.discard(filepath)
+        try:
+            filepath.unlink()
+        except FileNotFoundError:
+            pass
+
+
+    def discard(self):
+        "Delete spooled files not taken by filebloblist, as their message was not received"
+        for filepath in list(self.spooled):
+            self._remove(filepath)
+
+
+    def filebloblist(self, root):
+        """Replace oneBLOB members of the newBLOBVector root, which have a spoolfile
+           attribute created by this reader, with FileBLOB elements"""
+        for index, member in enumerate(root):
+            spoolfile = member.get("spoolfile")
+            if spoolfile is None:
+                continue
+            attrib = {key:value for key,value in member.attrib.items() if key != "spoolfile"}
+            filepath = pathlib.Path(spoolfile)
+            if filepath in self.spooled:
+                self.spooled.discard(filepath)
+                root[index] = FileBLOB(filepath, attrib)
+            else:
+                # not created by this reader, do not trust it
+                member.attrib.pop("spoolfile")
+
+
+class _StreamConnection(_ClientConnection):
+
+    """A client connection which streams FileBLOB elements in chunks.
+       A lock ensures a message being streamed is not interleaved with
+       other messages to the same client.
+       If rxblobfolder is given, BLOBs received in a newBLOBVector for
+       which streamdriver(devicename, vectorname) returns a driver are
+       written to files in that folder, and the message passed only to
+       that driver."""
+
+    def __init__(self, con_id, xml_data_que, chunksize, rxblobfolder=None, streamdriver=None):
+        super().__init__(con_id, xml_data_que)
+        self.chunksize = chunksize
+        self.rxblobfolder = rxblobfolder
+        self.streamdriver = streamdriver
+        self._txlock = asyncio.Lock()
+
+
+    async def handle_data(self, reader, writer):
+        "Used by asyncio.start_server, called to handle a client connection"
+        if self.rxblobfolder is not None:
+            reader = _SpoolReader(reader, self.rxblobfolder, self.chunksize, self.streamdriver)
+        await super().handle_data(reader, writer)
+
+
+    async def _xmlinput(self):
+        "As _ClientConnection._xmlinput, but any spooled BLOBs become FileBLOB members"
+        if not isinstance(self.reader, _SpoolReader):
+            return await super()._xmlinput()
+        try:
+            root = await super()._xmlinput()
+            if (root is not None) and (root.tag == "newBLOBVector"):
+                self.reader.filebloblist(root)
+        finally:
+            # files spooled for messages which failed to parse, or were not completed
+            self.reader.discard()
+        return root
+
+
+    async def _client_rx(self):
+        """As _ClientConnection._client_rx, but a newBLOBVector with FileBLOB members is
+           passed only to its driver, as the driver will move or delete the files"""
+        try:
+            while self.connected:
+                xmldata = await self._xmlinput()
+                if xmldata is None:
+                    return
+                if xmldata.tag == "enableBLOB":
+                    # set permission flags in the sendchecker object
+                    self.sendchecker.setpermissions(xmldata)
+                    # do not broadcast this, so continue
+                    continue
+                if (xmldata.tag == "newBLOBVector") and any(isinstance(member, FileBLOB) for member in xmldata):
+                    await self._driver_rx(xmldata)
+                    continue
+                # pass xmldata to xml_data_que
+                await self.xml_data_que.put( (self.con_id, xmldata) )
+                await asyncio.sleep(0)
+        except ConnectionError:
+            # re-raise this without creating a report, as it probably indicates
+            # a normal connection drop
+            raise
+        except Exception:
+            # possibly some other error, so report it
+            logger.exception("Exception report from _StreamConnection._client_rx")
+            raise
+
+
+    async def _driver_rx(self, xmldata):
+        "Pass the newBLOBVector with FileBLOB members to its driver, or delete the files"
+        # let messages already received from this client reach the drivers first
+        await self.xml_data_que.join()
+        await asyncio.sleep(0)
+        # checked again, as the device may have been disabled since the files were written
+        driver = self.streamdriver(xmldata.get("device"), xmldata.get("name"))
+        if driver is None:
+            _removefiles(xmldata)
+            return
+        try:
+            await driver._commsobj.driver_rx(self.con_id, xmldata)
+        except Exception:
+            logger.exception("Exception report from _StreamConnection._driver_rx")
+            _removefiles(xmldata)
+
+
+    async def _client_tx(self, con_id, xmldata):
+        "Sends data from port to client"
+        if self.con_id == con_id:
+            # do not tx data this driver is receiving
+            return
+        if not self.connected:
+            return
+        if not self.sendchecker.allowed(xmldata):
+            # this data should not be transmitted, discard it
+            return
+        async with self._txlock:
+            if not self.connected:
+                return
+            try:
+                if (xmldata.tag in ("setBLOBVector", "newBLOBVector")) and any(isinstance(child, FileBLOB) for child in xmldata):
+                    await self._stream_tx(xmldata)
+                else:
+                    self.writer.write(ET.tostring(xmldata))
+                    await self.writer.drain()
+            except ConnectionError:
+                self.shutdown()
+            except OSError:
+                # a file may have been removed, a message may have been partly
+                # written, so close this connection, but not the server
+                logger.exception("Unable to send BLOB file")
+                self.shutdown()
+
+
+    async def _stream_tx(self, xmldata):
+        "Writes the set or new BLOBVector, streaming the content of any FileBLOB members"
+        writer = self.writer
+        writer.write(_makestart(xmldata))
+        for child in xmldata:
+            if isinstance(child, FileBLOB):
+                writer.write(_makestart(child))
+                async for chunk in child.b64chunks(self.chunksize):
+                    writer.write(chunk)
+                    # wait for the client to accept this chunk before reading the next
+                    await writer.drain()
+                    if not self.connected:
+                        return
+                writer.write(b"</oneBLOB>")
+            else:
+                writer.write(ET.tostring(child))
+        writer.write(f"</{xmldata.tag}>".encode())
+        await writer.drain()
+
+
+class StreamBLOBServer(IPyServer):
+
+    """As IPyServer, but client connections stream FileBLOB members created
+       by StreamBLOBVector, reading chunksize bytes of the file at a time.
+       chunksize is rounded down to a multiple of three, so each chunk
+       encodes to base64 without padding.
+
+       If rxblobfolder is given, it should be an existing directory, BLOBs
+       received from clients for an enabled StreamBLOBVector of the drivers
+       are decoded as they arrive and written to new files in this folder,
+       rather than being held in memory."""
+
+    def __init__(self, *drivers, host="localhost", port=7624, maxconnections=5, chunksize=786432, rxblobfolder=None):
+        super().__init__(*drivers, host=host, port=port, maxconnections=maxconnections)
+        chunksize = max(3, chunksize - chunksize % 3)
+        if rxblobfolder is not None:
+            rxblobfolder = pathlib.Path(rxblobfolder).expanduser().resolve()
+            if not rxblobfolder.is_dir():
+                raise ValueError("If given, rxblobfolder should be an existing directory")
+        # replace the pool of client connections with streaming connections
+        self.connectionpool = [_StreamConnection(clientconnection.con_id, self.xml_data_que, chunksize, rxblobfolder, self._streamdriver)
+                                                 for clientconnection in self.connectionpool]
+
+
+    def _streamdriver(self, devicename, vectorname):
+        """Returns the driver if the vector is an enabled StreamBLOBVector, of an enabled
+           device, of one of the running drivers, able to receive files, otherwise None"""
+        for driver in self.drivers:
+            device = driver.get(devicename)
+            if device is None:
+                continue
+            vector = device.get(vectorname)
+            if driver.stop or (not device.enable) or (not isinstance(vector, StreamBLOBVector)) or (not vector.enable):
+                return
+            return driver
+
+
+class _StreamDriver(ipd.IPyDriver):
+
+    """IPyDriver is subclassed here, sends the file every ten seconds"""
+
+    async def hardware(self):
+        "Sends the blobpath file with ten second pauses"
+        devicename, blobpath = self.driverdata["blobinfo"]
+        blobvector = self[devicename]['blobvector']
+        while not self.stop:
+            blobvector["blobmember"] = blobpath
+            await blobvector.send_setVectorMembers(members=["blobmember"])
+            await asyncio.sleep(10)
+
+
+def make_driver(devicename, blobpath):
+    "Returns an instance of the driver, blobpath is path to file"
+
+    blobmember = ipd.BLOBMember( name="blobmember",
+                                 label="Streamed file")
+    blobvector = StreamBLOBVector( name="blobvector",
+                                   label="Streamed file",
+                                   group="File",
+                                   perm="ro",
+                                   state="Ok",
+                                   blobmembers=[blobmember] )
+    streamdevice = ipd.Device( devicename=devicename,
+                               properties=[blobvector] )
+    return _StreamDriver( streamdevice, blobinfo=(devicename, blobpath) )
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 2 or not os.path.isfile(sys.argv[1]):
+        print("Usage: python streamblob.py <path to file>")
+        sys.exit(1)
+
+    driver = make_driver("streamblob", sys.argv[1])
+    server = StreamBLOBServer(driver)
+    print(f"Running {__file__} with indipydriver version {ipd.version}")
+    asyncio.run(server.asyncrun())
@@ -0,0 +1,86 @@
+# /// script
+# requires-python = ">=3.10"
+# ///
+
+
+"""
+BlobStore, a content-addressed store of BLOBs in a folder, used by vkclient.py
+
+Each BLOB is saved in a file named by the sha256 digest of its content, with a
+suffix taken from the BLOB format, so identical BLOBs are only saved once. Files
+are written to a temporary name and then renamed, so a reader never sees a part
+written file, and as the content of a name never changes, a display given the
+path can read, mmap or sendfile it without checking whether it has changed.
+
+When the total size of the files exceeds maxbytes, the least recently stored
+files are deleted. Files already in the folder are included on startup.
+
+So a path given by put remains valid only until it is evicted. The path
+of the most recent BLOB is always kept, but an earlier path, perhaps still
+recorded by vkclient.py in a Valkey hash or stream entry, may have been
+deleted, and a display should treat FileNotFoundError as the BLOB having
+been evicted. Once opened, a file can be read to its end, as eviction only
+unlinks it.
+"""
+
+
+import collections, hashlib, os, pathlib, re
+
+
+# characters allowed in a filename suffix taken from a BLOB format
+_SUFFIX = re.compile(r"^(\.[A-Za-z0-9]+)+$")
+
+
+class BlobStore:
+
+    """A content-addressed store of BLOBs in folder, holding at most
+       maxbytes, other than the most recent BLOB which is always kept."""
+
+    def __init__(self, folder, maxbytes=1_000_000_000):
+        self.folder = pathlib.Path(folder).expanduser().resolve()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.maxbytes = maxbytes
+        # filename to size, ordered by last stored, oldest first
+        self._files = collections.OrderedDict()
+        # total size of the files
+        self.size = 0
+        existing = []
+        for path in self.folder.iterdir():
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                existing.append((stat.st_mtime, path.name, stat.st_size))
+        for mtime, name, size in sorted(existing):
+            self._files[name] = size
+            self.size += size
+        self._evict()
+
+
+    def put(self, data, blobformat=""):
+        """Stores the bytes data, if not already stored, and returns a tuple
+           (path, size, digest), where path is a pathlib.Path of the file, size
+           the number of bytes, and digest the hex sha256 digest of data."""
+        digest = hashlib.sha256(data).hexdigest()
+        suffix = blobformat if _SUFFIX.match(blobformat or "") else ""
+        name = digest + suffix
+        path = self.folder / name
+        if name in self._files and path.exists():
+            # already stored, mark as recently used
+            self._files.move_to_end(name)
+            os.utime(path)
+            return path, len(data), digest
+        temppath = self.folder / f".{name}.tmp"
+        temppath.write_bytes(data)
+        os.replace(temppath, path)
+        self.size -= self._files.pop(name, 0)
+        self._files[name] = len(data)
+        self.size += len(data)
+        self._evict()
+        return path, len(data), digest
+
+
+    def _evict(self):
+        "Delete the least recently stored files until the size is within maxbytes"
+        while self.size > self.maxbytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            (self.folder / name).unlink(missing_ok=True)
+            self.size -= size
@@ -0,0 +1,180 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "indipyclient",
+#     "valkey"
+# ]
+# ///
+
+
+"""Benchmark of writing INDI events to Valkey with handle_rxevents of vkclient.py
+
+   Events are first recorded by a QueClient from an INDI server, for example
+   multidevices/many.py or multidevices/loadtest.py, running on localhost
+   port 7624, followed by a full client snapshot. The recorded events are
+   then written to a local valkey server as fast as possible, firstly with
+   one awaited command per write, as vkclient.py originally did, and then by
+   handle_rxevents of vkclient.py, and then by handle_rxevents also adding
+   each update to a stream per vector. The events per second written, the bytes
+   sent to valkey per event, and the time to write the full snapshot, are
+   printed for each, and the resulting keys and values, other than streams,
+   checked to be the same.
+
+   python vkbench.py --seconds 10 --repeats 5 --db 15
+
+   The given valkey database number is flushed before each run.
+   This script imports vkclient.py, and assumes it is in the same directory."""
+
+
+import argparse, asyncio, time
+
+from indipyclient.queclient import QueClient
+
+import valkey.asyncio as valkey
+
+from vkclient import handle_rxevents
+
+
+async def record(seconds, indihost, indiport):
+    "Run a QueClient for the given seconds, and return the list of events, ending with a snapshot"
+    txque = asyncio.Queue()
+    rxque = asyncio.Queue()
+    client = QueClient(txque, rxque, indihost=indihost, indiport=indiport)
+    clienttask = asyncio.create_task(client.asyncrun())
+    await asyncio.sleep(seconds)
+    await txque.put((None, None, "snapshot"))
+    events = []
+    while True:
+        event = await rxque.get()
+        events.append(event)
+        if event.eventtype == "snapshot":
+            break
+    client.shutdown()
+    await clienttask
+    return events
+
+
+async def unpipelined(vk, events, channel, inc_blob):
+    """Write vector events and snapshots with one awaited command per write,
+       as vkclient.py did before using pipelines"""
+    for event in events:
+        if event.eventtype == "snapshot":
+            vectors = [(dname, vname, event.snapshot[dname][vname]) for dname in event.snapshot for vname in event.snapshot[dname]]
+        elif event.devicename and event.vectorname and event.eventtype != "Message":
+            vectors = [(event.devicename, event.vectorname, event.snapshot[event.devicename][event.vectorname])]
+        else:
+            continue
+        for devicename, vectorname, snapvector in vectors:
+            vectdict = snapvector.dictdump(inc_blob)
+            await vk.sadd('devices', devicename)
+            await vk.sadd(f'properties:{devicename}', vectorname)
+            mapping = {key:value for key,value in vectdict.items() if key != "members"}
+            for key,val in mapping.items():
+                if isinstance(val, bool):
+                    mapping[key] = "True" if val else "False"
+                if val is None:
+                    mapping[key] = "None"
+            await vk.hset(f'attributes:{devicename}:{vectorname}', mapping=mapping)
+            memberdict = vectdict["members"]
+            for membername, memberatts in memberdict.items():
+                await vk.sadd(f'members:{devicename}:{vectorname}', membername)
+                for key,val in memberatts.items():
+                    if isinstance(val, bool):
+                        memberatts[key] = "True" if val else "False"
+                    if val is None:
+                        memberatts[key] = "None"
+                await vk.hset(f'memberattributes:{devicename}:{vectorname}:{membername}', mapping=memberatts)
+        if event.eventtype == "snapshot":
+            await vk.publish(channel, "snapshot")
+        else:
+            await vk.publish(channel, f"{event.eventtype} {event.devicename} {event.vectorname}")
+
+
+async def pipelined(vk, events, channel, inc_blob, streams=None):
+    "Write vector events and snapshots with handle_rxevents of vkclient.py"
+    rxque = asyncio.Queue()
+    for event in events:
+        if event.eventtype == "snapshot" or (event.devicename and event.vectorname and event.eventtype != "Message"):
+            rxque.put_nowait(event)
+    task = asyncio.create_task(handle_rxevents(vk, rxque, channel, inc_blob, streams=streams))
+    await rxque.join()
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def streamed(vk, events, channel, inc_blob):
+    "Write vector events and snapshots with handle_rxevents of vkclient.py, with a stream per vector"
+    await pipelined(vk, events, channel, inc_blob, streams="vector")
+
+
+async def keyspace(vk):
+    "Returns a dictionary of every key and its value, with lists giving only their length, and excluding streams"
+    result = {}
+    async for key in vk.scan_iter():
+        if key.startswith(b"stream:"):
+            continue
+        keytype = await vk.type(key)
+        if keytype == b"hash":
+            result[key] = await vk.hgetall(key)
+        elif keytype == b"set":
+            result[key] = set(await vk.smembers(key))
+        elif keytype == b"list":
+            result[key] = await vk.llen(key)
+        else:
+            result[key] = keytype
+    return result
+
+
+async def runbench(args, events):
+    "Write the events with each method, print results, and check the keyspaces are the same"
+    updates = [event for event in events if event.eventtype != "snapshot" and event.devicename and event.vectorname and event.eventtype != "Message"]
+    snapshot = [event for event in events if event.eventtype == "snapshot"]
+    vk = valkey.Valkey(host=args.vkhost, port=args.vkport, db=args.db)
+    keyspaces = []
+    try:
+        for name, method in (("one command per write", unpipelined),
+                             ("handle_rxevents", pipelined),
+                             ("handle_rxevents with streams", streamed)):
+            eventtime = 0
+            snaptime = 0
+            inputbytes = 0
+            for n in range(args.repeats):
+                await vk.flushdb()
+                startbytes = (await vk.info("stats"))["total_net_input_bytes"]
+                start = time.perf_counter()
+                await method(vk, updates, "benchevent", False)
+                eventtime += time.perf_counter() - start
+                inputbytes += (await vk.info("stats"))["total_net_input_bytes"] - startbytes
+                start = time.perf_counter()
+                await method(vk, snapshot, "benchevent", False)
+                snaptime += time.perf_counter() - start
+            keyspaces.append(await keyspace(vk))
+            print(f"{name}: {len(updates)*args.repeats/eventtime:.0f} events/s, "
+                  f"{inputbytes/len(updates)/args.repeats:.0f} bytes sent to valkey per event, "
+                  f"full snapshot {snaptime/args.repeats*1000:.1f} ms")
+        print(f"Keys and values {'identical' if keyspaces[0] == keyspaces[1] == keyspaces[2] else 'DIFFER'}")
+        await vk.flushdb()
+    finally:
+        await vk.aclose()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare writing INDI events to valkey one command at a time and with handle_rxevents")
+    parser.add_argument("--seconds", type=float, default=10, help="Seconds to record events, default 10")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of times the events are written, default 5")
+    parser.add_argument("--indihost", default="localhost", help="Hostname of the INDI server, default localhost")
+    parser.add_argument("--indiport", type=int, default=7624, help="Port of the INDI server, default 7624")
+    parser.add_argument("--vkhost", default="localhost", help="Hostname of the valkey server, default localhost")
+    parser.add_argument("--vkport", type=int, default=6379, help="Port of the valkey server, default 6379")
+    parser.add_argument("--db", type=int, default=15, help="Valkey database number, flushed by this benchmark, default 15")
+    args = parser.parse_args()
+
+    print(f"Running {__file__}")
+    events = asyncio.run(record(args.seconds, args.indihost, args.indiport))
+    total = sum(len(device) for device in events[-1].snapshot.values())
+    print(f"Recorded {len(events)} events, the snapshot has {len(events[-1].snapshot)} devices, {total} vectors")
+    asyncio.run(runbench(args, events))
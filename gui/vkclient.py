@@ -12,17 +12,64 @@ This client uses QueClient to get snapshots of data and saves it to a Valkey ser
 
 This could be useful for a display, or multiple displays to continuously show updating values
 
-An example of accessing the valkey server is given in file vkprint.py
+An example of accessing the valkey server is given in file vkprint.py, and of
+reading the streams of vector updates in file vkstream.py
+
+The writes for each event are made in a single pipeline, so one INDI event is one
+round trip to the valkey server, and a snapshot is written in pipelines of a batch
+of vectors at a time. vkbench.py measures the rate of writing events.
 """
 
 import asyncio
 from indipyclient.queclient import QueClient
 
+# This imports blobstore.py, and assumes it is in the same directory
+from blobstore import BlobStore
+
 import valkey.asyncio as valkey
 
 
-async def _sendvector(vk, devicename, vectorname, vectdict):
-    """Function to save a vector dictionary to valkey
+def _hset(pipe, key, mapping, written, full):
+    """Adds an hset of mapping to the pipeline pipe, if full is False only the fields which
+       differ from those last written are set. written is a dictionary of key to the
+       mapping last written, which is updated"""
+    previous = written.get(key)
+    if full or previous is None:
+        changed = mapping
+    else:
+        changed = {field:value for field,value in mapping.items() if previous.get(field) != value}
+    if not changed:
+        return
+    pipe.hset(key, mapping=changed)
+    if previous is None:
+        written[key] = dict(changed)
+    else:
+        previous.update(changed)
+
+
+def _sadd(pipe, key, values, written, full):
+    """Adds an sadd of values to the pipeline pipe, if full is False only the values
+       not already written are added. written is a dictionary of key to the set
+       of values written, which is updated"""
+    previous = written.get(key)
+    if full or previous is None:
+        added = values
+    else:
+        added = [value for value in values if value not in previous]
+    if not added:
+        return
+    pipe.sadd(key, *added)
+    if previous is None:
+        written[key] = set(added)
+    else:
+        previous.update(added)
+
+
+def _sendvector(pipe, devicename, vectorname, vectdict, written, full):
+    """Function to add the commands saving a vector dictionary to valkey
+       to the pipeline pipe, these are sent when the pipeline is executed.
+       written is a dictionary recording what has been written, and unless
+       full is True, only values which have changed are written.
        Note, boolean values are saved as strings of either 'True' or 'False'
        None values are saved as the string 'None'
     """
@@ -34,25 +81,182 @@ async def _sendvector(vk, devicename, vectorname, vectdict):
             mapping[key] = "True" if val else "False"
         if val is None:
             mapping[key] = "None"
-    await vk.hset(f'attributes:{devicename}:{vectorname}', mapping=mapping)
+    _hset(pipe, f'attributes:{devicename}:{vectorname}', mapping, written, full)
 
     # save list of member names
     # get list of member names sorted by label
     memberdict = vectdict["members"]
     memberlist = list(memberdict.keys())
     memberlist.sort(key=lambda x: memberdict[x]['label'])
+    # add membernames to 'members:<devicename>:<vectorname>'
+    _sadd(pipe, f'members:{devicename}:{vectorname}', memberlist, written, full)
     for membername in memberlist:
-        await vk.sadd(f'members:{devicename}:{vectorname}', membername)   # add membername to 'members:<propertyname>:<devicename>'
         memberatts = memberdict[membername]
         for key,val in memberatts.items():
             if isinstance(val, bool):
                 memberatts[key] = "True" if val else "False"
             if val is None:
                 memberatts[key] = "None"
-        await vk.hset(f'memberattributes:{devicename}:{vectorname}:{membername}', mapping=memberatts)
+        _hset(pipe, f'memberattributes:{devicename}:{vectorname}:{membername}', memberatts, written, full)
+
+
+async def _vectdict(snapvector, inc_blob, blobstore, stored, eventtype):
+    """Returns the dictionary of the vector snapshot, if blobstore is given, BLOB
+       values are saved to it, and replaced by the path of the file, with fields
+       digest and filesize added. stored is a dictionary of (devicename, vectorname,
+       membername) to (value, path, size, digest) of the BLOB last saved, which is
+       reused unless eventtype is SetBLOB and a new value has been received"""
+    if blobstore is None or snapvector.vectortype != "BLOBVector":
+        return snapvector.dictdump(inc_blob)
+    vectdict = snapvector.dictdump(True)
+    for membername, memberatts in vectdict["members"].items():
+        value = memberatts["value"]
+        if not isinstance(value, bytes):
+            continue
+        key = (snapvector.devicename, snapvector.name, membername)
+        previous = stored.get(key)
+        if previous is not None and (eventtype != "SetBLOB" or previous[0] is value):
+            # State, TimeOut and snapshot events hold the BLOB already saved
+            value, path, size, digest = previous
+        else:
+            # writing a large BLOB could take a while, so is done in a thread
+            path, size, digest = await asyncio.to_thread(blobstore.put, value, memberatts["blobformat"])
+            stored[key] = (value, path, size, digest)
+        memberatts["value"] = str(path)
+        memberatts["digest"] = digest
+        memberatts["filesize"] = size
+    return vectdict
+
+
+def _xadd(pipe, streams, maxlen, eventtype, devicename, vectorname, vectdict):
+    """Adds an xadd of the vector state, timestamp, message and member values to
+       the pipeline pipe, to the vector stream if streams is "vector", or to the
+       device stream if streams is "device", trimmed to approximately maxlen entries"""
+    if streams == "vector":
+        key = f'stream:{devicename}:{vectorname}'
+    else:
+        key = f'stream:{devicename}'
+    fields = {"eventtype":eventtype,
+              "devicename":devicename,
+              "vectorname":vectorname,
+              "state":vectdict["state"],
+              "timestamp":vectdict["timestamp"],
+              "message":vectdict["message"]}
+    for membername, memberatts in vectdict["members"].items():
+        fields[f'value:{membername}'] = memberatts["value"]
+        if "formattedvalue" in memberatts:
+            fields[f'formattedvalue:{membername}'] = memberatts["formattedvalue"]
+    for field,val in fields.items():
+        if val is None:
+            fields[field] = "None"
+    pipe.xadd(key, fields, maxlen=maxlen, approximate=True)
+
+
+async def _writeevent(vk, event, channel, inc_blob, nbr, batch, written, streams, maxlen, blobstore, stored):
+    """Writes the event to valkey, as described in handle_rxevents, written is
+       a dictionary of the values previously written, and stored of the BLOBs
+       saved to blobstore"""
+
+    eventtype = event.eventtype
+    devicename = event.devicename
+    vectorname = event.vectorname
+    timestamp = event.timestamp
+    snapshot = event.snapshot
+
+    if eventtype == "getProperties":
+        return
+
+    if eventtype == "Delete":
+        # forget the BLOBs of the deleted device or vector
+        for key in [key for key in stored if key[0] == devicename and vectorname in (None, key[1])]:
+            del stored[key]
+
+    # definitions and snapshots write all values, other events only those changed
+    full = eventtype in ("Define", "DefineBLOB", "snapshot")
+
+    async with vk.pipeline(transaction=True) as pipe:
+
+        if eventtype == "Message":
+            if devicename is None:
+                # system wide message
+                messagelist = snapshot.messages
+                # a message consists of a timestamp and string
+                # get the message from the snapshot that this event refers to
+                for message in messagelist:
+                    if message[0] == timestamp:
+                        mt,ms = message
+                        break
+                else:
+                    return
+                # place <timestamp><space><message string> into list with key 'messages'
+                pipe.rpush("messages", f"{mt.isoformat(sep='T')} {ms}")
+                pipe.ltrim("messages", nbr, -1)
+            else:
+                # a device message
+                messagelist = snapshot[devicename].messages
+                # a message consists of a timestamp and string
+                # get the message from the snapshot that this event refers to
+                for message in messagelist:
+                    if message[0] == timestamp:
+                        mt,ms = message
+                        break
+                else:
+                    return
+                # place <timestamp><space><message string> into list with key 'messages<devicename>'
+                pipe.rpush(f"messages:{devicename}", f"{mt.isoformat(sep='T')} {ms}")
+                pipe.ltrim(f"messages:{devicename}", nbr, -1)
+
+        elif (devicename is not None) and (vectorname is not None):
+            if eventtype == "snapshot":
+                vectdict = await _vectdict(snapshot, inc_blob, blobstore, stored, eventtype)
+            else:
+                vectdict = await _vectdict(snapshot[devicename][vectorname], inc_blob, blobstore, stored, eventtype)
+            # add the device to vk set 'devices'
+            _sadd(pipe, 'devices', [devicename], written, full)
+            _sadd(pipe, f'properties:{devicename}', [vectorname], written, full)   # add property name to 'properties:<devicename>'
+            _sendvector(pipe, devicename, vectorname, vectdict, written, full)
+            if streams:
+                _xadd(pipe, streams, maxlen, eventtype, devicename, vectorname, vectdict)
+
+        elif (eventtype == "snapshot") and (devicename is not None):
+            # add the device to vk set 'devices'
+            _sadd(pipe, 'devices', [devicename], written, full)
+            # device snapshot
+            for count, vname in enumerate(snapshot.keys(), start=1):
+                vectdict = await _vectdict(snapshot[vname], inc_blob, blobstore, stored, eventtype)
+                _sadd(pipe, f'properties:{devicename}', [vname], written, full)   # add property name to 'properties:<devicename>'
+                _sendvector(pipe, devicename, vname, vectdict, written, full)
+                if streams:
+                    _xadd(pipe, streams, maxlen, eventtype, devicename, vname, vectdict)
+                if not count % batch:
+                    await pipe.execute()
+
+        elif eventtype == "snapshot":
+            count = 0
+            for dname in snapshot.keys():
+                _sadd(pipe, 'devices', [dname], written, full)
+                for vname in snapshot[dname].keys():
+                    vectdict = await _vectdict(snapshot[dname][vname], inc_blob, blobstore, stored, eventtype)
+                    _sadd(pipe, f'properties:{dname}', [vname], written, full)   # add property name to 'properties:<devicename>'
+                    _sendvector(pipe, dname, vname, vectdict, written, full)
+                    if streams:
+                        _xadd(pipe, streams, maxlen, eventtype, dname, vname, vectdict)
+                    count += 1
+                    if not count % batch:
+                        await pipe.execute()
+
+        # publish a note on a channel to indicate a change has occurred
+        if vectorname:
+            pipe.publish(channel, f"{eventtype} {devicename} {vectorname}")
+        elif devicename:
+            pipe.publish(channel, f"{eventtype} {devicename}")
+        else:
+            pipe.publish(channel, f"{eventtype}")
+
+        await pipe.execute()
 
 
-async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8):
+async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8, batch=100, streams=None, maxlen=1000, blobstore=None):
     """On being called when an event is received, this saves data to valkey
 
        vk is a Valkey async connection, which should be created using valkey.asyncio.Valkey
@@ -60,6 +264,10 @@ async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8):
        channel is a pubsub channel string, notifications of an event will be published on this channel
        inc_blob is True if BLOBs are to be saved in the valkey database, False if not
        nbr is the number of received system and device messages to keep in valkey lists
+       batch is the number of vectors written in each pipeline when a snapshot is received
+       streams, if "vector" or "device", also adds each vector update to a stream per vector or per device
+       maxlen is the approximate maximum number of entries kept in each stream
+       blobstore, if given, is a BlobStore of blobstore.py, received BLOBs are saved to it rather than to valkey
 
        Valkey keys used:
 
@@ -72,6 +280,24 @@ async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8):
       f"memberattributes:{devicename}:{vectorname}:{membername}" - a mapping of each member attribute with its value, for the given member
                                                                    this will include the actual member value
 
+      If streams is "vector" or "device", also:
+
+      f"stream:{devicename}:{vectorname}" - if streams is "vector", a stream with an entry for each update of the vector
+      f"stream:{devicename}" - if streams is "device", a stream with an entry for each update of any vector of the device
+
+      Each stream entry has fields eventtype, devicename, vectorname, state, timestamp and message, and for
+      each member, f"value:{membername}" and, if the member has one, f"formattedvalue:{membername}". A display
+      can therefore XREAD the streams, rather than reading hashes after each notification, and each stream
+      holds a history of approximately maxlen updates.
+
+      If blobstore is given, the BLOB bytes are saved to a file named by the sha256 digest of the content,
+      and the BLOB member attributes hold the path of the file as the value, with added attributes digest and
+      filesize, so valkey memory holds no BLOB data. A display can read the file from the path. Only a SetBLOB
+      event saves a BLOB, other events of the vector reuse the path and digest already saved. As the store
+      deletes its least recently saved files when over its size limit, a path held in a hash, and more often
+      one in an older stream entry, may no longer exist, and a display should treat FileNotFoundError as the
+      BLOB having been evicted.
+
       The attributes referred to above are those indi attributes specified for a vector and member, such as 'label' etc., with a few
       useful extras such as 'formattedvalue'.
 
@@ -84,6 +310,15 @@ async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8):
 
       This could be used by an appropriate client to listen for events, and only read the database when an event occurs.
 
+      The writes for an event, and its notification, are sent in one pipeline as a transaction, so a client
+      reading the database after a notification sees all the changes of the event. rxque.task_done() is
+      called once the event is written.
+
+      The values written are recorded, and for events other than Define, DefineBLOB and snapshot,
+      only the hash fields and set members which differ from those last written are sent, typically
+      the member values, state and timestamp. This assumes no other client alters these keys, a
+      snapshot request rewrites every value.
+
       The eventtype is that received from QueClient, it is a string:
 
       One of Message, getProperties, Delete, Define, DefineBLOB, Set, SetBLOB,
@@ -95,88 +330,24 @@ async def handle_rxevents(vk, rxque, channel, inc_blob, nbr=8):
 
 """
 
+    if streams not in (None, "vector", "device"):
+        raise ValueError('streams should be None, "vector" or "device"')
+
     # set nbr to a value used by ltrim to reduce the number of messages in the list
     nbr = -nbr
 
+    # dictionary of key to the values last written
+    written = {}
+    # dictionary of (devicename, vectorname, membername) to the BLOB last saved to blobstore
+    stored = {}
+
     while True:
 
         event = await rxque.get()
-
-        eventtype = event.eventtype
-        devicename = event.devicename
-        vectorname = event.vectorname
-        timestamp = event.timestamp
-        snapshot = event.snapshot
-
-        rxque.task_done()
-
-        if eventtype == "getProperties":
-            continue
-
-        if eventtype == "Message":
-            if devicename is None:
-                # system wide message
-                messagelist = snapshot.messages
-                # a message consists of a timestamp and string
-                # get the message from the snapshot that this event refers to
-                for message in messagelist:
-                    if message[0] == timestamp:
-                        mt,ms = message
-                        break
-                else:
-                    continue
-                # place <timestamp><space><message string> into list with key 'messages'
-                await vk.rpush("messages", f"{mt.isoformat(sep='T')} {ms}")
-                await vk.ltrim("messages", nbr, -1)
-            else:
-                # a device message
-                messagelist = snapshot[devicename].messages
-                # a message consists of a timestamp and string
-                # get the message from the snapshot that this event refers to
-                for message in messagelist:
-                    if message[0] == timestamp:
-                        mt,ms = message
-                        break
-                else:
-                    continue
-                # place <timestamp><space><message string> into list with key 'messages<devicename>'
-                await vk.rpush(f"messages:{devicename}", f"{mt.isoformat(sep='T')} {ms}")
-                await vk.ltrim(f"messages:{devicename}", nbr, -1)
-
-        elif (devicename is not None) and (vectorname is not None):
-            if eventtype == "snapshot":
-                vectdict = snapshot.dictdump(inc_blob)
-            else:
-                vectdict = snapshot[devicename][vectorname].dictdump(inc_blob)
-            # add the device to vk set 'devices'
-            await vk.sadd('devices', devicename)
-            await vk.sadd(f'properties:{devicename}', vectorname)   # add property name to 'properties:<devicename>'
-            await _sendvector(vk, devicename, vectorname, vectdict)
-
-        elif (eventtype == "snapshot") and (devicename is not None):
-            # add the device to vk set 'devices'
-            await vk.sadd('devices', devicename)
-            # device snapshot
-            for vname in snapshot.keys():
-                vectdict = snapshot[vname].dictdump(inc_blob)
-                await vk.sadd(f'properties:{devicename}', vname)   # add property name to 'properties:<devicename>'
-                await _sendvector(vk, devicename, vname, vectdict)
-
-        elif eventtype == "snapshot":
-            for dname in snapshot.keys():
-                await vk.sadd('devices', dname)
-                for vname in snapshot[dname].keys():
-                    vectdict = snapshot[dname][vname].dictdump(inc_blob)
-                    await vk.sadd(f'properties:{dname}', vname)   # add property name to 'properties:<devicename>'
-                    await _sendvector(vk, dname, vname, vectdict)
-
-        # publish a note on a channel to indicate a change has occurred
-        if vectorname:
-            await vk.publish(channel, f"{eventtype} {devicename} {vectorname}")
-        elif devicename:
-            await vk.publish(channel, f"{eventtype} {devicename}")
-        else:
-            await vk.publish(channel, f"{eventtype}")
+        try:
+            await _writeevent(vk, event, channel, inc_blob, nbr, batch, written, streams, maxlen, blobstore, stored)
+        finally:
+            rxque.task_done()
 
 
 async def main():
@@ -186,7 +357,11 @@ async def main():
         txque = asyncio.Queue(maxsize=4)  # txque is not used in this example, but could be used to send data
         rxque = asyncio.Queue(maxsize=4)
         client = QueClient(txque, rxque, indihost="localhost", indiport=7624, blobfolder=None)
-        task1 = asyncio.create_task(handle_rxevents(vk, rxque, "indievent", False))
+        # enable BLOBs, which are saved to files in folder vkblobs, limited to 100MB, with their paths saved in valkey
+        client.enableBLOBdefault = "Also"
+        blobstore = BlobStore("vkblobs", maxbytes=100_000_000)
+        # streams is set to "vector", so updates are also added to a stream per vector, as read by vkstream.py
+        task1 = asyncio.create_task(handle_rxevents(vk, rxque, "indievent", False, streams="vector", blobstore=blobstore))
         await client.asyncrun()
     finally:
         task1.cancel()
@@ -11,6 +11,12 @@ Illustrates how INDI parameters stored in a Valkey server using vkclient.py
 can be read. This prints valkey keys and contents, and then continues to print
 member attributes as they are received.
 Something similar could be used by a 'display' service to show an instruments output
+
+The values are read by VKMirror of vkreader.py, which holds a local copy, and for
+each notification reads only the vector named, in one round trip. A second display
+function could be added to the same mirror, sharing these reads.
+
+This imports vkreader.py, and assumes it is in the same directory.
 """
 
 
@@ -18,64 +24,64 @@ import pprint
 
 import valkey
 
+from vkreader import VKMirror
 
-def main(vk, channel):
-
-    p = vk.pubsub(ignore_subscribe_messages=True)
-    p.subscribe(channel)
 
+def printall(mirror):
+    "Prints the contents of the mirror, with the valkey keys they are read from"
     print("This prints the INDI parameters stored in a Valkey service")
     print("with all items decoded from their byte values")
-    messages = vk.lrange('messages', 0, -1)
     print("KEY - 'messages'")
-    pprint.pp(messages)
+    pprint.pp(mirror.messages)
     print("------------------")
-    devicenames = vk.smembers('devices')
     print("KEY - 'devices'")
-    pprint.pp(devicenames)
+    pprint.pp(set(mirror.devices))
     print("------------------")
-    for devicename in devicenames:
+    for devicename, vectors in mirror.devices.items():
         key = f"messages:{devicename}"
         print(f"KEY - '{key}'")
-        messages = vk.lrange(key, 0, -1)
-        pprint.pp(messages)
+        pprint.pp(mirror.devicemessages.get(devicename, []))
         print("------------------")
         key = f"properties:{devicename}"
         print(f"KEY - '{key}'")
-        vectornames = vk.smembers(key)
-        pprint.pp(vectornames)
+        pprint.pp(set(vectors))
         print("------------------")
-        for vectorname in vectornames:
+        for vectorname, vector in vectors.items():
             key = f"attributes:{devicename}:{vectorname}"
             print(f"KEY - '{key}'")
-            attdict = vk.hgetall(key)
-            pprint.pp(attdict)
+            pprint.pp(vector["attributes"])
             print("------------------")
             key = f"members:{devicename}:{vectorname}"
             print(f"KEY - '{key}'")
-            membernames  = vk.smembers(key)
-            pprint.pp(membernames)
-            print("------------------")
-            for membername in membernames:
-                key = f"memberattributes:{devicename}:{vectorname}:{membername}"
-                print(f"KEY - '{key}'")
-                mattdict = vk.hgetall(key)
-                pprint.pp(mattdict)
-                print("------------------")
-
-    for message in p.listen():
-        items = message['data'].split(" ")
-        if len(items) != 3:
-            continue
-        devicename = items[1]
-        vectorname = items[2]
-        membernames  = vk.smembers(f"members:{devicename}:{vectorname}")
-        for membername in membernames:
-            key = f"memberattributes:{devicename}:{vectorname}:{membername}"
-            print(f"KEY - '{key}'")
-            mattdict = vk.hgetall(key)
-            pprint.pp(mattdict)
+            pprint.pp(set(vector["members"]))
             print("------------------")
+            printmembers(devicename, vectorname, vector)
+
+
+def printmembers(devicename, vectorname, vector):
+    "Prints the member attributes of the vector"
+    for membername, mattdict in vector["members"].items():
+        key = f"memberattributes:{devicename}:{vectorname}:{membername}"
+        print(f"KEY - '{key}'")
+        pprint.pp(mattdict)
+        print("------------------")
+
+
+def display(mirror, eventtype, devicename, vectorname):
+    "Called by the mirror after each notification"
+    if eventtype == "load":
+        printall(mirror)
+    elif vectorname:
+        vector = mirror.vector(devicename, vectorname)
+        if vector is not None:
+            printmembers(devicename, vectorname, vector)
+
+
+def main(vk, channel):
+    mirror = VKMirror(vk, channel)
+    mirror.add_display(display)
+    mirror.run()
+
 
 if __name__ == "__main__":
     vk = valkey.Valkey(host='localhost', port=6379, decode_responses=True)
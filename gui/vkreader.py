@@ -0,0 +1,153 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "valkey"
+# ]
+# ///
+
+
+"""
+VKMirror, a reader of the INDI data saved to Valkey by vkclient.py, keeping a
+local mirror of it, updated by the notifications published by vkclient.py
+
+On startup the whole keyspace is read in a few pipelines. Then, for each
+notification naming a vector, only that vector is read, its attributes and
+member attributes in a single pipeline, being one round trip however many
+members it has. The member names are held by the mirror, and only read again
+when the vector is defined.
+
+Displays register a callback with add_display, and are called after the mirror
+is updated, so a number of displays in one process share the one mirror, and
+the one set of reads. vkprint.py uses this.
+"""
+
+
+class VKMirror:
+
+    """A local mirror of the INDI data in valkey. vk should be a valkey.Valkey
+       connection, created with decode_responses=True, and channel the channel
+       on which vkclient.py publishes notifications."""
+
+    def __init__(self, vk, channel="indievent"):
+        self.vk = vk
+        self.channel = channel
+        # system messages, and devicename to list of device messages
+        self.messages = []
+        self.devicemessages = {}
+        # devicename to dictionary of vectorname to vector, where each vector is
+        # a dictionary {"attributes":attributes, "members":{membername:memberattributes}}
+        self.devices = {}
+        # the number of round trips made to valkey
+        self.reads = 0
+        self._displays = []
+
+
+    def add_display(self, callback):
+        """Register callback, which will be called as callback(mirror, eventtype, devicename, vectorname)
+           after each notification has been applied to the mirror, devicename and vectorname
+           may be None."""
+        self._displays.append(callback)
+
+
+    def vector(self, devicename, vectorname):
+        """Returns the mirrored vector as a dictionary {"attributes":attributes, "members":{membername:memberattributes}}
+           or None if not known"""
+        return self.devices.get(devicename, {}).get(vectorname)
+
+
+    def _execute(self, pipe):
+        "Execute the pipeline and return the results"
+        self.reads += 1
+        return pipe.execute()
+
+
+    def load(self):
+        "Reads the whole INDI keyspace into the mirror"
+        pipe = self.vk.pipeline(transaction=False)
+        pipe.lrange('messages', 0, -1)
+        pipe.smembers('devices')
+        messages, devicenames = self._execute(pipe)
+        self.messages = messages
+        devicenames = list(devicenames)
+        pipe = self.vk.pipeline(transaction=False)
+        for devicename in devicenames:
+            pipe.lrange(f"messages:{devicename}", 0, -1)
+            pipe.smembers(f"properties:{devicename}")
+        results = self._execute(pipe)
+        self.devices = {}
+        self.devicemessages = {}
+        vectors = []
+        for index, devicename in enumerate(devicenames):
+            self.devicemessages[devicename] = results[2*index]
+            self.devices[devicename] = {}
+            vectors.extend((devicename, vectorname) for vectorname in results[2*index+1])
+        self._fetchvectors(vectors, readmembers=True)
+
+
+    def _fetchvectors(self, vectors, readmembers):
+        """Reads the given list of (devicename, vectorname) into the mirror, if readmembers is
+           True, or a vector is not known, its member names are first read"""
+        if readmembers:
+            newvectors = vectors
+        else:
+            newvectors = [(devicename, vectorname) for devicename, vectorname in vectors if self.vector(devicename, vectorname) is None]
+        membernames = {}
+        if newvectors:
+            pipe = self.vk.pipeline(transaction=False)
+            for devicename, vectorname in newvectors:
+                pipe.smembers(f"members:{devicename}:{vectorname}")
+            for key, names in zip(newvectors, self._execute(pipe)):
+                membernames[key] = sorted(names)
+        for devicename, vectorname in vectors:
+            if (devicename, vectorname) not in membernames:
+                membernames[devicename, vectorname] = list(self.devices[devicename][vectorname]["members"])
+        pipe = self.vk.pipeline(transaction=False)
+        for devicename, vectorname in vectors:
+            pipe.hgetall(f"attributes:{devicename}:{vectorname}")
+            for membername in membernames[devicename, vectorname]:
+                pipe.hgetall(f"memberattributes:{devicename}:{vectorname}:{membername}")
+        results = iter(self._execute(pipe))
+        for devicename, vectorname in vectors:
+            attributes = next(results)
+            members = {membername:next(results) for membername in membernames[devicename, vectorname]}
+            self.devices.setdefault(devicename, {})[vectorname] = {"attributes":attributes, "members":members}
+
+
+    def handle(self, message):
+        "Apply a notification message to the mirror, and call the displays"
+        items = message['data'].split(" ")
+        eventtype = items[0]
+        devicename = items[1] if len(items) > 1 else None
+        vectorname = items[2] if len(items) > 2 else None
+        if vectorname:
+            self._fetchvectors([(devicename, vectorname)], readmembers=eventtype in ("Define", "DefineBLOB"))
+        elif eventtype == "Message":
+            pipe = self.vk.pipeline(transaction=False)
+            if devicename:
+                pipe.lrange(f"messages:{devicename}", 0, -1)
+                self.devicemessages[devicename] = self._execute(pipe)[0]
+            else:
+                pipe.lrange('messages', 0, -1)
+                self.messages = self._execute(pipe)[0]
+        elif devicename:
+            # a device deleted, or a device snapshot, read its vectors
+            pipe = self.vk.pipeline(transaction=False)
+            pipe.smembers(f"properties:{devicename}")
+            vectornames = self._execute(pipe)[0]
+            self._fetchvectors([(devicename, vectorname) for vectorname in vectornames], readmembers=True)
+        elif eventtype == "snapshot":
+            self.load()
+        for display in self._displays:
+            display(self, eventtype, devicename, vectorname)
+
+
+    def run(self):
+        "Subscribe to the notifications, load the mirror, and apply each notification received, this blocks"
+        p = self.vk.pubsub(ignore_subscribe_messages=True)
+        # subscribe before loading, so no change is missed
+        p.subscribe(self.channel)
+        self.load()
+        for display in self._displays:
+            display(self, "load", None, None)
+        for message in p.listen():
+            self.handle(message)
@@ -0,0 +1,78 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "valkey"
+# ]
+# ///
+
+
+"""
+Illustrates reading the streams of vector updates written by vkclient.py, when
+its handle_rxevents is called with streams="vector". This prints the last few
+updates held in each stream, and then blocks on XREAD, printing each update as
+it arrives, with its member values, so no further reads of the hashes are needed.
+Something similar could be used by a 'display' service to show an instruments output
+"""
+
+
+import time
+
+import valkey
+
+
+def streamkeys(vk):
+    "Returns a list of the vector stream keys"
+    keys = []
+    for devicename in vk.smembers('devices'):
+        for vectorname in vk.smembers(f"properties:{devicename}"):
+            keys.append(f"stream:{devicename}:{vectorname}")
+    return keys
+
+
+def printentry(key, entryid, fields):
+    "Print a stream entry"
+    print(f"KEY - '{key}' ID - '{entryid}'")
+    print(f"    {fields['eventtype']} state {fields['state']} timestamp {fields['timestamp']}")
+    for field, value in fields.items():
+        if field.startswith("formattedvalue:"):
+            print(f"    {field[15:]} : {value}")
+        elif field.startswith("value:") and f"formattedvalue:{field[6:]}" not in fields:
+            print(f"    {field[6:]} : {value}")
+
+
+def main(vk, history=3):
+
+    print("This prints the vector updates stored in Valkey streams")
+    # for each stream, the id of the last entry read
+    lastids = {}
+    for key in streamkeys(vk):
+        entries = vk.xrevrange(key, count=history)
+        for entryid, fields in reversed(entries):
+            printentry(key, entryid, fields)
+        lastids[key] = entries[0][0] if entries else "0"
+
+    checktime = time.monotonic()
+    while True:
+        if not lastids:
+            # no streams have been written yet, XREAD needs at least one key
+            time.sleep(1)
+            for key in streamkeys(vk):
+                lastids[key] = "0"
+            continue
+        # block for up to a second
+        result = vk.xread(lastids, block=1000)
+        for key, entries in result:
+            for entryid, fields in entries:
+                printentry(key, entryid, fields)
+                lastids[key] = entryid
+        # every second, check for new vectors
+        if time.monotonic() - checktime > 1:
+            checktime = time.monotonic()
+            for key in streamkeys(vk):
+                if key not in lastids:
+                    lastids[key] = "0"
+
+
+if __name__ == "__main__":
+    vk = valkey.Valkey(host='localhost', port=6379, decode_responses=True)
+    main(vk)
@@ -0,0 +1,44 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = []
+# ///
+
+
+import json
+import urllib.request
+from time import sleep
+
+# As getjson.py, but rather than polling, this opens an event stream from jsonapi.py
+# running on a device 'raspberry5' which is serving a Thermostat device, filtered
+# to the temperaturevector, and prints the temperature each time it changes.
+
+while True:
+
+    try:
+        with urllib.request.urlopen('http://raspberry5/events/Thermostat/temperaturevector') as f:
+
+            # each line of the stream is read as it arrives, an event being
+            # 'id: version' and 'data: JSON' lines followed by an empty line
+
+            for line in f:
+                if not line.startswith(b'data:'):
+                    # ids, empty lines, and comments sent to keep the stream open
+                    continue
+
+                event = json.loads(line[5:])
+
+                # event is a dictionary with keys 'eventtype', 'devicename' and 'vectorname'
+                # the first event has eventtype 'snapshot', and each following event the
+                # indipyclient event type, such as 'Define', 'Set', 'Delete' or 'Message'.
+                # Where the event concerns the vector, key 'vector' holds the vector as given
+                # by getjson.py at nesteddict['devices']['Thermostat']['vectors']['temperaturevector']
+
+                vector = event.get('vector')
+                if vector:
+                    print(vector['members']['temperature']['formattedvalue'])
+
+    except OSError:
+        pass
+
+    # the stream has closed, or could not be opened, wait and reconnect
+    sleep(10)
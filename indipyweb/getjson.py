@@ -5,22 +5,41 @@
 
 
 import json
+import urllib.error
 import urllib.request
 from time import sleep
 
 # Every 10 seconds this example calls indipyweb running on a device 'raspberry5' which
 # is serving a Thermostat device, and prints the temperature
 
+# The ETag of the last snapshot received is sent with each request, and if the
+# service supports it, as jsonapi.py does, the reply is 304 Not Modified with no
+# body if nothing has changed, and the last snapshot is used again.
+
+etag = None
+nesteddict = None
+
 while True:
 
     # get a snapshot
 
-    with urllib.request.urlopen('http://raspberry5/api/') as f:
-        snapshot = f.read().decode('utf-8')
+    request = urllib.request.Request('http://raspberry5/api/')
+    if etag:
+        request.add_header('If-None-Match', etag)
+    try:
+        with urllib.request.urlopen(request) as f:
+            snapshot = f.read().decode('utf-8')
+            etag = f.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        # not modified, nesteddict is unchanged
+        snapshot = None
 
     # snapshot is a string snapshot of the state of the client
 
-    nesteddict = json.loads(snapshot)
+    if snapshot is not None:
+        nesteddict = json.loads(snapshot)
 
     # nesteddict is a nested dictionary, in this case of the Thermostat example.
     # It would be worth doing a pretty print of this to see how the dictionary is laid out
@@ -38,6 +57,10 @@ while True:
     # within 'members', 'temperature' is the name of the particular member we want
     # within a specific number member, key 'formattedvalue' gives a string of the number
 
+    # Where only one value is wanted, the routes /api/Thermostat and /api/Thermostat/temperaturevector
+    # return just the device or vector dictionary, and jsonapi.py also serves
+    # /api/Thermostat/temperaturevector/temperature, the member dictionary only.
+
     print(t)
 
     sleep(10)
@@ -0,0 +1,50 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver",
+#     "indipyclient"
+# ]
+# ///
+
+# As singlescript.py, a single script to run the thermostat and window drivers
+# and indipyserver, but rather than running indipyweb in a subprocess, which
+# connects back to the server over a socket, the JSON API service of jsonapi.py
+# is added to the server in-process, and runs in the same event loop.
+# This serves JSON only, at http://host:8000/api/ and the other routes
+# described in jsonapi.py, rather than web pages.
+
+# This imports jsonapi.py, and assumes it is in the same directory.
+
+import asyncio
+
+import indipydriver as ipd
+
+from indipyserver import IPyServer
+
+from jsonapi import add_jsonapi
+
+# Assuming the thermostat example is example2.py,
+# and the window example is example3.py
+
+import example2, example3
+# make the thermostat driver
+thermodriver = example2.make_driver("Thermostat", 15)
+# make the window driver
+windowdriver = example3.make_driver("Window", "Thermostat")
+
+server = IPyServer(thermodriver, windowdriver)
+
+# add the JSON service, listening on all interfaces, port 8000
+service = add_jsonapi(server, host="0.0.0.0", port=8000)
+
+print(f"Running {__file__}")
+print(f"JSON service running on {service.host}:{service.port}")
+
+try:
+    # run the IPyServer, which also runs the JSON service
+    asyncio.run( server.asyncrun() )
+except KeyboardInterrupt:
+    print("Keyboard Interrupt")
+
+print("Application Stopped")
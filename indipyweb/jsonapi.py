@@ -0,0 +1,605 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipyclient",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""A JSON API service, serving the same JSON document as the /api/ route of
+   indipyweb, from a cache which is only rebuilt where INDI events change it.
+
+   The /api/ route of indipyweb takes a snapshot of its client, and converts
+   the whole of it to JSON, on every request. So a number of dashboards each
+   polling the same Raspberry Pi cost a full serialisation of every device,
+   vector and member per poll, even when nothing has changed.
+
+   JSONClient is an IPyClient which holds the JSON text of each vector and
+   each device. When an event arrives, only the changed vector, and the
+   device containing it, are marked for rebuilding, and on the next request
+   only those are serialised again, the document then being joined from the
+   cached parts. While no event arrives, the same bytes object is served to
+   every request.
+
+   Each change increments a version number, which gives the document ETag,
+   so a poller sending If-None-Match with the ETag it last received is
+   answered with 304 Not Modified, and no body, if nothing has changed.
+
+   As with indipyweb, /api/{device} and /api/{device}/{vector} give the JSON of
+   a single device or vector, and /api/{device}/{vector}/{member} that of a
+   single member, so a lookup of one value need not fetch every device. These
+   are served from the same cache, members being cached as each vector is
+   serialised, and each has its own ETag, changing only when that device, or
+   vector, changes. An unknown device, vector or member gives 404 Not Found.
+
+   JSONService is a minimal asyncio HTTP/1.1 server serving the document at
+   /api and /api/ with GET and HEAD requests, so with no further dependencies
+   this can run beside, or in place of, indipyweb on a small device where
+   only the JSON output is needed.
+
+   Rather than polling, a client can GET /events, /events/{device} or
+   /events/{device}/{vector}, a Server-Sent Events stream, as read by the
+   EventSource of a browser. The first event holds the JSON of the whole
+   client, device or vector, and then for each INDI event passing the filter,
+   an event holds the JSON of the changed vector, or for device messages and
+   deletions the device, or for connection and client messages, the client
+   connection status and messages. Each is serialised once, however many
+   streams are connected, and the serialised vector is also reused by the
+   next document. A stream falling more than maxqueue events behind is
+   closed, and an EventSource then reconnects, starting with a new snapshot.
+
+   python jsonapi.py --indihost localhost --indiport 7624 --host 0.0.0.0 --port 8000
+
+   Where the drivers are served by an IPyServer in the same script, calling
+
+   service = add_jsonapi(server, host="0.0.0.0", port=8000)
+
+   before server.asyncrun() adds the service to the server in-process, much
+   as server.add_remote adds a remote link. The JSONClient is then joined to
+   the server by the in-memory link of loopback.py, in the snapshot directory
+   of this repository, in place of a socket, receiving the same
+   xml.etree.ElementTree elements the drivers send, without them being
+   serialised to XML text and parsed again, and the client and the HTTP
+   server run in the server event loop, started and shut down with it.
+   inprocess.py shows this.
+
+   getjson.py sends If-None-Match, and so benefits when polling this service,
+   and getevents.py reads an event stream."""
+
+
+import argparse, asyncio, json, logging, pathlib, secrets, sys
+
+from urllib.parse import unquote, urlsplit
+
+from indipyclient import IPyClient
+
+# This imports loopback.py from the snapshot directory of this repository, which
+# holds the in-memory link used by add_jsonapi, so the parts of it using internals
+# of indipyserver are not repeated here
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent / "snapshot"))
+from loopback import LoopbackMixin, _Loopback, _join
+
+logger = logging.getLogger(__name__)
+
+
+# the changed vectors of a device, used when the whole device has changed
+_ALLVECTORS = None
+
+# json.dumps default separators, so the document is the same as json.dumps(snapshot.dictdump())
+_COMMA = b", "
+_COLON = b": "
+
+
+def _messagelist(messages):
+    "Returns the list of [timestamp, message] as given by dictdump"
+    return [[message[0].isoformat(sep='T'), message[1]] for message in messages]
+
+
+def _jsonmapping(fragments):
+    "Returns bytes of a JSON object from fragments, a dictionary of key to JSON bytes"
+    return b"{" + _COMMA.join(json.dumps(key).encode() + _COLON + fragment for key, fragment in fragments.items()) + b"}"
+
+
+def _jsonobject(header, name, value):
+    """Returns bytes of a JSON object, being the dictionary header with a
+       final key name, whose value is the JSON bytes value"""
+    return json.dumps(header).encode()[:-1] + _COMMA + json.dumps(name).encode() + _COLON + value + b"}"
+
+
+def _vectordump(vector):
+    """Returns a tuple of the JSON bytes of the vector, as json.dumps(vector.snapshot().dictdump()),
+       and a dictionary of membername to the JSON bytes of each member"""
+    vecdict = vector.snapshot().dictdump()
+    memberjson = {membername:json.dumps(memdict).encode() for membername, memdict in vecdict.pop("members").items()}
+    return _jsonobject(vecdict, "members", _jsonmapping(memberjson)), memberjson
+
+
+class JSONClient(LoopbackMixin, IPyClient):
+
+    """An IPyClient holding the JSON of its devices and vectors, which is
+       rebuilt only for those changed by received events. It may be joined
+       to an IPyServer in-process by add_jsonapi."""
+
+    def __init__(self, indihost="localhost", indiport=7624, **clientdata):
+        super().__init__(indihost, indiport, **clientdata)
+        # devicename to dictionary of vectorname to vector JSON bytes
+        self._vectorjson = {}
+        # devicename to dictionary of vectorname to dictionary of membername to member JSON bytes
+        self._memberjson = {}
+        # devicename to device JSON bytes
+        self._devicejson = {}
+        # devicename to set of changed vectornames, or _ALLVECTORS
+        self._changed = {}
+        # the JSON bytes of the whole client, None if it must be rebuilt
+        self._document = None
+        # incremented on every change, and used with a random prefix as the ETag,
+        # so an ETag given before a restart is never matched after it
+        self.version = 0
+        self._etagprefix = secrets.token_hex(4)
+        # the version of the last connection event, after which everything has changed
+        self._clearversion = 0
+        # devicename to the version of the last change to anything in the device
+        self._deviceversion = {}
+        # devicename to the version of the last change to all the vectors of the device
+        self._allversion = {}
+        # (devicename, vectorname) to the version of the last change to the vector
+        self._vectorversion = {}
+        # callables called with each event after it is recorded
+        self._listeners = []
+
+
+    @property
+    def etag(self):
+        "The ETag of the current document"
+        return f'"{self._etagprefix}-{self.version}"'
+
+
+    def device_etag(self, devicename):
+        "The ETag of the current JSON of the device"
+        version = max(self._clearversion, self._deviceversion.get(devicename, 0))
+        return f'"{self._etagprefix}-{version}"'
+
+
+    def vector_etag(self, devicename, vectorname):
+        "The ETag of the current JSON of the vector, and of each of its members"
+        version = max(self._clearversion, self._allversion.get(devicename, 0), self._vectorversion.get((devicename, vectorname), 0))
+        return f'"{self._etagprefix}-{version}"'
+
+
+    def add_listener(self, callback):
+        """Register callback, which will be called as callback(event) after
+           each event which may change the document has been recorded"""
+        self._listeners.append(callback)
+
+
+    def remove_listener(self, callback):
+        "Remove a callback registered with add_listener"
+        self._listeners.remove(callback)
+
+
+    def _setchanged(self, eventtype, devicename, vectorname):
+        "Record the vectors changed by this event"
+        if eventtype in ("ConnectionMade", "ConnectionLost"):
+            # the client is cleared on connection events, so rebuild everything
+            self._changed = {devicename:_ALLVECTORS for devicename in self._devicejson}
+            self._changed.update((devicename, _ALLVECTORS) for devicename in self.data)
+            self._clearversion = self.version
+            return
+        if not devicename:
+            # client messages are held in the document only
+            return
+        self._deviceversion[devicename] = self.version
+        if vectorname:
+            vectornames = self._changed.setdefault(devicename, set())
+            if vectornames is not _ALLVECTORS:
+                vectornames.add(vectorname)
+            self._vectorversion[devicename, vectorname] = self.version
+        elif eventtype == "Message":
+            # only the device messages have changed, the vectors are unchanged
+            self._changed.setdefault(devicename, set())
+        else:
+            # a device delete, or unknown event
+            self._changed[devicename] = _ALLVECTORS
+            self._allversion[devicename] = self.version
+
+
+    async def rxevent(self, event):
+        "Marks the parts of the document changed by the event"
+        if event.eventtype == "getProperties":
+            # nothing held by the client is altered
+            return
+        self.version += 1
+        self._setchanged(event.eventtype, event.devicename, event.vectorname)
+        self._document = None
+        for callback in self._listeners:
+            callback(event)
+
+
+    def _rebuild(self):
+        "Serialise the changed devices and vectors"
+        changed = self._changed
+        self._changed = {}
+        for devicename, vectornames in changed.items():
+            self._rebuilddevice(devicename, vectornames)
+
+
+    def _rebuilddevice(self, devicename, vectornames):
+        "Serialise the device, and its vectors in vectornames, or all its vectors if _ALLVECTORS"
+        device = self.data.get(devicename)
+        if device is None:
+            self._vectorjson.pop(devicename, None)
+            self._memberjson.pop(devicename, None)
+            self._devicejson.pop(devicename, None)
+            return
+        cached = self._vectorjson.get(devicename)
+        cachedmembers = self._memberjson.get(devicename)
+        if cached is None or vectornames is _ALLVECTORS:
+            cached = {}
+        vectorjson = {}
+        memberjson = {}
+        # keep the order of the vectors in the device
+        for vectorname, vector in device.data.items():
+            if vectorname not in cached or vectorname in vectornames:
+                vectorjson[vectorname], memberjson[vectorname] = _vectordump(vector)
+            else:
+                vectorjson[vectorname] = cached[vectorname]
+                memberjson[vectorname] = cachedmembers[vectorname]
+        self._vectorjson[devicename] = vectorjson
+        self._memberjson[devicename] = memberjson
+        header = {"devicename":devicename,
+                  "enable":device.enable,
+                  "messages":_messagelist(device.messages)}
+        self._devicejson[devicename] = _jsonobject(header, "vectors", _jsonmapping(vectorjson))
+
+
+    def vectorjson(self, devicename, vectorname):
+        """Returns the JSON bytes of the vector, as json.dumps(vector.snapshot().dictdump()),
+           or None if the vector is not known. If the vector has changed, it is serialised
+           here, and the result cached for the next document."""
+        device = self.data.get(devicename)
+        if device is None:
+            return
+        vector = device.data.get(vectorname)
+        if vector is None:
+            return
+        vectornames = self._changed.get(devicename, ())
+        cached = self._vectorjson.setdefault(devicename, {})
+        if vectornames is _ALLVECTORS or vectorname in vectornames or vectorname not in cached:
+            cached[vectorname], self._memberjson.setdefault(devicename, {})[vectorname] = _vectordump(vector)
+            if vectornames:
+                # the device is still rebuilt, but reuses this vector
+                vectornames.discard(vectorname)
+        return cached[vectorname]
+
+
+    def memberjson(self, devicename, vectorname, membername):
+        """Returns the JSON bytes of the member, as found in the members of the vector JSON,
+           or None if the member is not known"""
+        if self.vectorjson(devicename, vectorname) is None:
+            return
+        return self._memberjson[devicename][vectorname].get(membername)
+
+
+    def devicejson(self, devicename):
+        """Returns the JSON bytes of the device, as json.dumps(device.snapshot().dictdump()),
+           or None if the device is not known"""
+        if devicename in self._changed:
+            self._rebuilddevice(devicename, self._changed.pop(devicename))
+        return self._devicejson.get(devicename)
+
+
+    def document(self):
+        "Returns the JSON bytes of the whole client, as json.dumps(client.snapshot().dictdump())"
+        if self._document is None:
+            self._rebuild()
+            header = {"indihost":self.indihost,
+                      "indiport":self.indiport,
+                      "connected":self.connected,
+                      "messages":_messagelist(self.messages)}
+            # keep the order of the devices in the client
+            devicejson = {devicename:self._devicejson[devicename] for devicename in self.data if devicename in self._devicejson}
+            self._document = _jsonobject(header, "devices", _jsonmapping(devicejson))
+        return self._document
+
+
+class _EventStream:
+
+    "An event stream connection, with its filter and queue of frames to send"
+
+    def __init__(self, devicename, vectorname, maxqueue):
+        self.devicename = devicename
+        self.vectorname = vectorname
+        # frames to send, None closes the stream
+        self.queue = asyncio.Queue(maxsize=maxqueue)
+
+    def wants(self, devicename, vectorname):
+        "Returns True if an event of this device and vector passes the filter"
+        if devicename is None or self.devicename is None:
+            # client events are sent to every stream
+            return True
+        if devicename != self.devicename:
+            return False
+        return vectorname is None or self.vectorname is None or vectorname == self.vectorname
+
+    def put(self, frame):
+        "Queue the frame, if the queue is full, the stream is closed so the client can reconnect"
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+        return True
+
+
+class JSONService:
+
+    """A minimal HTTP/1.1 server, serving the JSON document of the JSONClient
+       at /api and /api/, and the parts of it at /api/{device}, /api/{device}/{vector}
+       and /api/{device}/{vector}/{member}, with ETag and If-None-Match support,
+       and an event stream of changes at /events, /events/{device} and
+       /events/{device}/{vector}."""
+
+    def __init__(self, client, host="localhost", port=8000, maxqueue=100, keepalive=15):
+        self.client = client
+        self.host = host
+        self.port = port
+        # shutdown routine sets this to True to stop the server
+        self._stop = False
+        # the number of frames an event stream may have waiting, and the seconds
+        # without an event after which a comment is sent to keep the stream open
+        self.maxqueue = maxqueue
+        self.keepalive = keepalive
+        # counts of responses, by status code
+        self.responses = {}
+        # the connected event streams
+        self._streams = []
+        # event streams closed for falling behind
+        self.dropped = 0
+        # the writers of open connections, closed on shutdown
+        self._writers = set()
+        client.add_listener(self._push)
+
+
+    def route(self, segments, headers):
+        """Returns a tuple (etag, body) for the given path segments, or None if not found,
+           body being a bytes object, or a callable returning one"""
+        if not segments or segments[0] != "api" or len(segments) > 4:
+            return
+        client = self.client
+        if len(segments) == 1:
+            return client.etag, client.document
+        devicename = segments[1]
+        device = client.data.get(devicename)
+        if device is None:
+            return
+        if len(segments) == 2:
+            return client.device_etag(devicename), lambda: client.devicejson(devicename)
+        vectorname = segments[2]
+        vector = device.data.get(vectorname)
+        if vector is None:
+            return
+        if len(segments) == 3:
+            return client.vector_etag(devicename, vectorname), lambda: client.vectorjson(devicename, vectorname)
+        membername = segments[3]
+        if membername not in vector.data:
+            return
+        return client.vector_etag(devicename, vectorname), lambda: client.memberjson(devicename, vectorname, membername)
+
+
+    def _frame(self, eventtype, devicename, vectorname):
+        """Returns the event stream frame for the event, or None if there is nothing to send.
+           The data is a JSON object with keys eventtype, devicename and vectorname, and
+           a further key 'vector', 'device' or 'client' holding the JSON of what has changed,
+           and for client events, keys 'connected' and 'messages'"""
+        client = self.client
+        header = {"eventtype":eventtype, "devicename":devicename, "vectorname":vectorname}
+        if devicename is None:
+            if eventtype == "snapshot":
+                data = _jsonobject(header, "client", client.document())
+            else:
+                header["connected"] = client.connected
+                header["messages"] = _messagelist(client.messages)
+                data = json.dumps(header).encode()
+        elif vectorname:
+            vectorjson = client.vectorjson(devicename, vectorname)
+            if vectorjson is None:
+                if eventtype != "snapshot":
+                    return
+                vectorjson = b"null"
+            data = _jsonobject(header, "vector", vectorjson)
+        else:
+            devicejson = client.devicejson(devicename)
+            if devicejson is None:
+                if eventtype != "snapshot":
+                    return
+                devicejson = b"null"
+            data = _jsonobject(header, "device", devicejson)
+        return b"id: %d\ndata: %s\n\n" % (client.version, data)
+
+
+    def _push(self, event):
+        "Called by the client for each event, queues a frame, made once, to each stream wanting it"
+        if not self._streams:
+            return
+        frame = None
+        for stream in list(self._streams):
+            if not stream.wants(event.devicename, event.vectorname):
+                continue
+            if frame is None:
+                frame = self._frame(event.eventtype, event.devicename, event.vectorname)
+                if frame is None:
+                    return
+            if not stream.put(frame):
+                self._streams.remove(stream)
+                self.dropped += 1
+
+
+    async def stream(self, writer, devicename=None, vectorname=None):
+        """Sends a text/event-stream response, starting with a snapshot of the client,
+           device or vector, and then a frame for each event passing the filter"""
+        stream = _EventStream(devicename, vectorname, self.maxqueue)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        writer.write(self._frame("snapshot", devicename, vectorname))
+        self._streams.append(stream)
+        try:
+            await writer.drain()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(stream.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    frame = b":\n\n"
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+        finally:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+
+    def respond(self, method, segments, headers):
+        "Returns a tuple (status, headers, body) for the request"
+        if method not in ("GET", "HEAD"):
+            return "405 Method Not Allowed", {"Allow": "GET, HEAD"}, b""
+        found = self.route(segments, headers)
+        if found is None:
+            return "404 Not Found", {}, b""
+        etag, body = found
+        responseheaders = {"ETag": etag, "Cache-Control": "no-cache"}
+        ifnonematch = headers.get("if-none-match")
+        if ifnonematch and (ifnonematch.strip() == "*" or etag in (tag.strip() for tag in ifnonematch.split(","))):
+            return "304 Not Modified", responseheaders, b""
+        if callable(body):
+            body = body()
+        responseheaders["Content-Type"] = "application/json"
+        return "200 OK", responseheaders, body
+
+
+    async def handle(self, reader, writer):
+        "Handles a connection, answering requests until it is closed"
+        self._writers.add(writer)
+        try:
+            while not self._stop:
+                requestline = await reader.readline()
+                if not requestline:
+                    break
+                try:
+                    method, target, httpversion = requestline.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if httpversion == "HTTP/1.0":
+                    keepalive = headers.get("connection", "").lower() == "keep-alive"
+                else:
+                    keepalive = headers.get("connection", "").lower() != "close"
+                if method not in ("GET", "HEAD") or "content-length" in headers or "transfer-encoding" in headers:
+                    # a request body is not read, so the connection is closed
+                    # rather than parsing the body as the next request
+                    keepalive = False
+                segments = [unquote(segment) for segment in urlsplit(target).path.split("/") if segment]
+                if method == "GET" and segments and segments[0] == "events" and len(segments) <= 3:
+                    self.responses["200"] = self.responses.get("200", 0) + 1
+                    await self.stream(writer, *segments[1:])
+                    break
+                status, responseheaders, body = self.respond(method, segments, headers)
+                self.responses[status[:3]] = self.responses.get(status[:3], 0) + 1
+                responseheaders["Content-Length"] = str(len(body))
+                responseheaders["Connection"] = "keep-alive" if keepalive else "close"
+                head = f"HTTP/1.1 {status}\r\n" + "".join(f"{name}: {value}\r\n" for name, value in responseheaders.items()) + "\r\n"
+                writer.write(head.encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keepalive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception:
+            logger.exception("Exception report from JSONService.handle method")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+    def shutdown(self):
+        "Shuts down the HTTP server, closing any event streams and open connections"
+        self._stop = True
+        for stream in self._streams:
+            stream.put(None)
+        # a connection held open by a keep-alive client would otherwise
+        # keep the server, on Python 3.12 and later, from closing
+        for writer in list(self._writers):
+            writer.close()
+
+
+    async def asyncrun(self):
+        "Await this method to run the HTTP server"
+        self._stop = False
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        async with server:
+            while not self._stop:
+                await asyncio.sleep(0.5)
+
+
+class _ServiceLink(_Loopback):
+
+    """The link of loopback.py, joining a JSONClient to an IPyServer in the
+       same process, which also runs and shuts down the HTTP service"""
+
+    def __init__(self, client, service):
+        super().__init__(client)
+        self.service = service
+
+
+    def shutdown(self):
+        "Called by the server on shutdown"
+        super().shutdown()
+        self.service.shutdown()
+
+
+    async def asyncrun(self):
+        "Called by the server, runs the client and the HTTP server"
+        await asyncio.gather(self.client.asyncrun(), self.service.asyncrun())
+
+
+def add_jsonapi(server, host="localhost", port=8000, maxqueue=100, keepalive=15):
+    """Adds a JSONService to the IPyServer server, with a JSONClient joined to it
+       in-process, to run when the server runs. Returns the JSONService, whose
+       client attribute is the JSONClient. Call before server.asyncrun()"""
+    client = JSONClient(server.host, server.port)
+    service = JSONService(client, host, port, maxqueue, keepalive)
+    _join(server, _ServiceLink(client, service))
+    return service
+
+
+async def main(indihost, indiport, host, port):
+    "Run the client and the HTTP server"
+    client = JSONClient(indihost, indiport)
+    service = JSONService(client, host, port)
+    await asyncio.gather(client.asyncrun(), service.asyncrun())
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve the JSON document of an INDI service, rebuilt only where changed")
+    parser.add_argument("--indihost", default="localhost", help="Hostname of the INDI server, default localhost")
+    parser.add_argument("--indiport", type=int, default=7624, help="Port of the INDI server, default 7624")
+    parser.add_argument("--host", default="localhost", help="Listening host of the web server, default localhost")
+    parser.add_argument("--port", type=int, default=8000, help="Listening port of the web server, default 8000")
+    args = parser.parse_args()
+
+    print(f"Running {__file__}")
+    try:
+        asyncio.run(main(args.indihost, args.indiport, args.host, args.port))
+    except KeyboardInterrupt:
+        print("Shutting down")
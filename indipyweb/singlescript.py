@@ -9,6 +9,8 @@
 
 # A single script to run the thermostat and window drivers,
 # indipyserver and the indipyweb service.
+# Where only the JSON output is needed, inprocess.py runs the
+# service in the same process and event loop as the server.
 
 import asyncio, subprocess, sys
 
@@ -0,0 +1,262 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""
+   Load generation benchmark built on the drivers of many.py
+
+   Runs an IPyServer in a child process serving N sets of the many.py
+   devices (switches, lights, numbers, textdevice and blobmaker), each set
+   also having a "load" device with M number vectors. Every device is updated
+   at the given interval, rather than the human scale one second of many.py.
+
+   K clients are then connected from this process, each sends a getProperties
+   and counts the set vectors it receives. After the given duration a report
+   is printed giving messages per second, end to end latency percentiles
+   (client receive time minus the timestamp set by the driver when sending)
+   and the resident memory of the server process.
+
+   For example, to run 4 sets of devices, each load device with 20 vectors,
+   updating every 10ms, with 5 clients for 30 seconds:
+
+   python loadtest.py --sets 4 --vectors 20 --interval 0.01 --clients 5 --duration 30
+
+   Note IPyServer accepts at most 10 client connections.
+   Server memory is read from /proc, and so is only reported on Linux.
+"""
+
+
+import argparse, asyncio, multiprocessing, re, time
+
+from datetime import datetime, timezone
+
+import indipydriver as ipd
+
+from indipyserver import IPyServer
+
+import many
+
+
+class LoadDriver(ipd.IPyDriver):
+    """IPyDriver is subclassed here
+       It has one device with a number of ro vectors, each
+       with a single member which is incremented and sent every interval"""
+
+    async def hardware(self):
+        """Send every load vector every interval seconds"""
+
+        devicename = self.driverdata['devicename']
+        interval = self.driverdata['interval']
+
+        loadvectors = list(self[devicename].values())
+        count = 0
+        while not self.stop:
+            await asyncio.sleep(interval)
+            count += 1
+            for vector in loadvectors:
+                vector["loadmember"] = count
+                await vector.send_setVector()
+
+
+def make_load_driver(devicename, vectors, interval):
+    "Returns an instance of the driver, with the given number of vectors"
+
+    loadvectors = []
+    for v in range(vectors):
+        member = ipd.NumberMember( name = "loadmember",
+                                   label = "Count",
+                                   format = "%d",
+                                   membervalue = 0 )
+        loadvectors.append( ipd.NumberVector( name = f"loadvector{v}",
+                                              label = f"Load {v}",
+                                              group = "Load",
+                                              perm = "ro",
+                                              state = "Ok",
+                                              numbermembers = [member] ) )
+
+    # create a device with these vectors
+    loaddevice = ipd.Device( devicename=devicename, properties=loadvectors )
+
+    # Create the Driver, containing this Device
+    driver = LoadDriver( loaddevice, devicename=devicename, interval=interval )
+
+    # and return the driver
+    return driver
+
+
+def make_drivers(sets, vectors, interval):
+    "Returns a list of drivers, each set being the many.py drivers plus a load driver"
+    drivers = []
+    for n in range(sets):
+        drivers.append( many.make_switch_driver(f"switches{n}", interval) )
+        drivers.append( many.make_light_driver(f"lights{n}", f"switches{n}", interval) )
+        drivers.append( many.make_number_driver(f"numbers{n}", interval) )
+        drivers.append( many.make_text_driver(f"textdevice{n}", interval) )
+        drivers.append( many.make_blob_driver(f"blobmaker{n}", 1) )
+        if vectors:
+            drivers.append( make_load_driver(f"load{n}", vectors, interval) )
+    return drivers
+
+
+def runserver(sets, vectors, interval, port, clients):
+    "Runs in the child process, creates the drivers and serves them"
+    drivers = make_drivers(sets, vectors, interval)
+    server = IPyServer(*drivers, port=port, maxconnections=clients)
+    asyncio.run(server.asyncrun())
+
+
+def server_rss(pid):
+    "Return the VmRSS and VmHWM of the process in kB, as a tuple, or (None, None) if unavailable"
+    rss = hwm = None
+    try:
+        with open(f"/proc/{pid}/status") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    hwm = int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return rss, hwm
+
+
+# matches the start of any set vector, capturing the tag and the timestamp attribute
+_SETSTART = re.compile(rb'<(set\w+Vector)\s[^>]*?timestamp="([^"]+)"')
+
+
+class LoadClient:
+    """Connects to the server, sends a getProperties and then
+       counts set vectors received, recording their latency"""
+
+    def __init__(self, port):
+        self.port = port
+        self.counts = {}
+        self.latencies = []
+        # only count when recording is True, so warm up traffic is ignored
+        self.recording = False
+
+    async def run(self, stopped):
+        "Receive data until stopped is set"
+        reader, writer = await asyncio.open_connection("localhost", self.port, limit=2**20)
+        writer.write(b'<getProperties version="1.7" />')
+        await writer.drain()
+        try:
+            while not stopped.is_set():
+                try:
+                    data = await reader.readuntil(b'>')
+                except asyncio.LimitOverrunError as e:
+                    # part of a large BLOB, discard it
+                    await reader.readexactly(e.consumed)
+                    continue
+                except asyncio.IncompleteReadError:
+                    return
+                if not self.recording:
+                    continue
+                match = _SETSTART.search(data)
+                if match is None:
+                    continue
+                rxtime = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+                tag, tstring = match.groups()
+                self.counts[tag] = self.counts.get(tag, 0) + 1
+                try:
+                    sent = datetime.fromisoformat(tstring.decode())
+                except ValueError:
+                    continue
+                self.latencies.append((rxtime - sent).total_seconds())
+        finally:
+            writer.close()
+
+
+def percentile(ordered, p):
+    "Return the p percentile of the ordered list"
+    if not ordered:
+        return float('nan')
+    index = min(len(ordered)-1, int(round(p/100.0 * (len(ordered)-1))))
+    return ordered[index]
+
+
+async def runclients(args, pid):
+    "Connect the clients, warm up, record for the duration, then print a report"
+
+    stopped = asyncio.Event()
+    loadclients = [LoadClient(args.port) for k in range(args.clients)]
+    tasks = [asyncio.create_task(client.run(stopped)) for client in loadclients]
+
+    # allow the definitions and any initial burst to pass
+    await asyncio.sleep(args.warmup)
+    for client in loadclients:
+        client.recording = True
+
+    rsslist = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        await asyncio.sleep(1)
+        rss, hwm = server_rss(pid)
+        if rss is not None:
+            rsslist.append(rss)
+    elapsed = time.perf_counter() - start
+    stopped.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # collect results
+    counts = {}
+    latencies = []
+    for client in loadclients:
+        for tag, number in client.counts.items():
+            counts[tag] = counts.get(tag, 0) + number
+        latencies.extend(client.latencies)
+    latencies.sort()
+    total = sum(counts.values())
+
+    # messages the drivers should be generating per second
+    expected = args.sets * (4 + args.vectors) / args.interval
+
+    print(f"Sets of devices: {args.sets}, load vectors per set: {args.vectors}, interval: {args.interval}s, clients: {args.clients}")
+    print(f"Approximate messages per second generated by drivers: {expected:.0f}")
+    print(f"Messages received per second, all clients: {total/elapsed:.0f}")
+    print(f"Messages received per second, per client: {total/elapsed/args.clients:.0f}")
+    for tag, number in sorted(counts.items()):
+        print(f"    {tag.decode()}: {number/elapsed:.0f} per second")
+    print("Latency ms: " + ", ".join(f"p{p} {percentile(latencies, p)*1000:.1f}" for p in (50, 90, 99))
+          + f", max {percentile(latencies, 100)*1000:.1f}")
+    if rsslist:
+        rss, hwm = server_rss(pid)
+        print(f"Server RSS kB: start {rsslist[0]}, end {rsslist[-1]}, peak {hwm}")
+    else:
+        print("Server RSS unavailable")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Load generation benchmark using the many.py drivers")
+    parser.add_argument("--sets", type=int, default=1, help="Number of sets of many.py devices, default 1")
+    parser.add_argument("--vectors", type=int, default=10, help="Number of vectors in each load device, default 10")
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between updates of each vector, default 0.1")
+    parser.add_argument("--clients", type=int, default=1, help="Number of concurrent clients, 1 to 10, default 1")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to record for, default 10")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds to wait before recording, default 2")
+    parser.add_argument("--port", type=int, default=7624, help="Port of the server, default 7624")
+    args = parser.parse_args()
+
+    if args.clients < 1 or args.clients > 10:
+        parser.error("clients should be between 1 and 10")
+
+    serverprocess = multiprocessing.Process(target=runserver,
+                                            args=(args.sets, args.vectors, args.interval, args.port, args.clients),
+                                            daemon=True)
+    serverprocess.start()
+    print(f"Running {__file__}")
+    try:
+        # give the server time to start listening
+        time.sleep(1)
+        asyncio.run(runclients(args, serverprocess.pid))
+    finally:
+        serverprocess.terminate()
+        serverprocess.join()
@@ -245,15 +245,16 @@ class SwitchDriver(ipd.IPyDriver):
 
 
     async def hardware(self):
-        """Send a new ro switch value every second"""
+        """Send a new ro switch value every interval seconds, default one second"""
 
         devicename = self.driverdata['devicename']
+        interval = self.driverdata['interval']
 
         rovector = self[devicename]['ROvector']
         while not self.stop:
-            # send a new switch value every second
+            # send a new switch value every interval
             for s in range(5):
-                await asyncio.sleep(1)
+                await asyncio.sleep(interval)
                 if rovector[f"ROMmember{s}"] == "On":
                     rovector[f"ROMmember{s}"] = "Off"
                 else:
@@ -261,8 +262,8 @@ class SwitchDriver(ipd.IPyDriver):
                 await rovector.send_setVector()
 
 
-def make_switch_driver(devicename):
-    "Returns an instance of the driver"
+def make_switch_driver(devicename, interval=1):
+    "Returns an instance of the driver, interval is the seconds between RO switch updates"
 
     # create five members with rule OneOfMany
 
@@ -353,7 +354,7 @@ def make_switch_driver(devicename):
                          properties=[oom_vector, amo_vector, aom_vector, ro_vector] )
 
     # Create the Driver, containing this Device
-    driver = SwitchDriver( switchingdevice, devicename=devicename)
+    driver = SwitchDriver( switchingdevice, devicename=devicename, interval=interval)
 
     # and return the driver
     return driver
@@ -373,15 +374,16 @@ class LightDriver(ipd.IPyDriver):
            Then does the same again, but with Busy and Idle lights"""
 
         devicename = self.driverdata['devicename']
+        interval = self.driverdata['interval']
 
         binvector = self[devicename]['binvector']
 
 
         while not self.stop:
-            # send a new lights count every second
+            # send a new lights count every interval, default one second
             for n in range(16):
                 # Send it with colours red and green - to show off colours
-                await asyncio.sleep(1)
+                await asyncio.sleep(interval)
                 binstring = f'{n:04b}'       # strings "0000" to "1111" generated as n increments
                 binvector['binvalue0'] = "Alert" if binstring[3] == "1" else "Ok"
                 binvector['binvalue1'] = "Alert" if binstring[2] == "1" else "Ok"
@@ -390,7 +392,7 @@ class LightDriver(ipd.IPyDriver):
                 await binvector.send_setVector()
             for n in range(16):
                 # and then with colours black and yellow - to show off colours
-                await asyncio.sleep(1)
+                await asyncio.sleep(interval)
                 binstring = f'{n:04b}'       # strings "0000" to "1111" generated as n increments
                 binvector['binvalue0'] = "Idle" if binstring[3] == "1" else "Busy"
                 binvector['binvalue1'] = "Idle" if binstring[2] == "1" else "Busy"
@@ -423,8 +425,8 @@ class LightDriver(ipd.IPyDriver):
 
 
 
-def make_light_driver(devicename, switchdevicename):
-    "Returns an instance of the driver"
+def make_light_driver(devicename, switchdevicename, interval=1):
+    "Returns an instance of the driver, interval is the seconds between binvector updates"
 
     # create four LightMembers, binvalue0 to binvalue3
     members= []
@@ -463,7 +465,7 @@ def make_light_driver(devicename, switchdevicename):
                              properties=[binvector, snoopvector] )
 
     # Create the Driver, containing this Device
-    driver = LightDriver( bincounter, devicename=devicename, switchdevicename=switchdevicename )
+    driver = LightDriver( bincounter, devicename=devicename, switchdevicename=switchdevicename, interval=interval )
 
     # Set this driver snooping on the AOMvector of the switch device
     driver.snoop(switchdevicename, 'AOMvector')
@@ -491,15 +493,16 @@ class NumberDriver(ipd.IPyDriver):
 
 
     async def hardware(self):
-        """Send a new ro number value every second"""
+        """Send a new ro number value every interval seconds, default one second"""
 
         devicename = self.driverdata['devicename']
+        interval = self.driverdata['interval']
 
         timevector = self[devicename]['timevector']
 
         while not self.stop:
-            # send a new time number value every second
-            await asyncio.sleep(1)
+            # send a new time number value every interval
+            await asyncio.sleep(interval)
             dtnow = datetime.now(tz=timezone.utc)
             # and update the members
             timevector["utctimemember"] = dtnow.strftime("%H:%M:%S")
@@ -507,8 +510,8 @@ class NumberDriver(ipd.IPyDriver):
             await timevector.send_setVector()
 
 
-def make_number_driver(devicename):
-    "Returns an instance of the driver"
+def make_number_driver(devicename, interval=1):
+    "Returns an instance of the driver, interval is the seconds between timevector updates"
 
     # create a ro number 'time' vector, with two members showing the time
     timestamp = datetime.now(tz=timezone.utc)
@@ -560,7 +563,7 @@ def make_number_driver(devicename):
                           properties=[timevector, numbervector] )
 
     # Create the Driver, containing this Device
-    driver = NumberDriver( numbers, devicename=devicename )
+    driver = NumberDriver( numbers, devicename=devicename, interval=interval )
 
     # and return the driver
     return driver
@@ -585,25 +588,26 @@ class TextDriver(ipd.IPyDriver):
 
 
     async def hardware(self):
-        """Send a new ro text value every three seconds"""
+        """Send a new ro text value every interval seconds, default three seconds"""
 
         devicename = self.driverdata['devicename']
+        interval = self.driverdata['interval']
 
         rotextvector = self[devicename]['rotextvector']
 
         values = ("One", "Two", "Three")
 
         while not self.stop:
-            # send a new text value every three seconds
+            # send a new text value every interval
             for tv in values:
-                await asyncio.sleep(3)
+                await asyncio.sleep(interval)
                 rotextvector["rotextmember1"] = tv
                 rotextvector["rotextmember2"] = tv
                 await rotextvector.send_setVector()
 
 
-def make_text_driver(devicename):
-    "Returns an instance of the driver"
+def make_text_driver(devicename, interval=3):
+    "Returns an instance of the driver, interval is the seconds between rotextvector updates"
 
     # create a ro text vector
     rotextmember1 = ipd.TextMember( name = "rotextmember1",
@@ -638,7 +642,7 @@ def make_text_driver(devicename):
                              properties=[rotextvector, textvector] )
 
     # Create the Driver, containing this Device
-    driver = TextDriver( textdevice, devicename=devicename )
+    driver = TextDriver( textdevice, devicename=devicename, interval=interval )
 
     # and return the driver
     return driver
@@ -10,6 +10,10 @@
 # When run on a Raspberry pi, reports its temperature every ten seconds
 # and provides a four hour temperature chart
 
+# The temperature is only transmitted if its displayed value has changed,
+# using ThrottledNumberVector from throttle.py, which is assumed to be in
+# the same directory as this script
+
 import subprocess, asyncio, re, time
 from collections import deque
 
@@ -19,6 +23,8 @@ import indipydriver as ipd
 
 from indipyserver import IPyServer
 
+from throttle import ThrottledNumberVector
+
 
 #def get_temp() -> float|None:
 #    "Return the temperature, return None on error"
@@ -88,7 +94,7 @@ async def send_temperature(device):
     while not device.stop:
         await asyncio.sleep(10)
         temperature = get_temp()
-        # Send the temperature every 10 seconds
+        # Send the temperature every 10 seconds, if its formatted value has changed
         if temperature is not None:
             temperaturevector['celsius'] = temperature
             temperaturevector['fahrenheit'] = 32 + temperature * 9.0/5.0
@@ -222,13 +228,15 @@ def make_driver(devicename):
                                    label="Fahrenheit",
                                    format='%3.1f',
                                    membervalue=32 + current_temperature * 9.0/5.0)
-    # Make a NumberVector instance, containing the members.
-    temperaturevector = ipd.NumberVector( name="temperaturevector",
-                                          label="Temperature",
-                                          group="Values",
-                                          perm="ro",
-                                          state="Ok",
-                                          numbermembers=[celsius, fahrenheit] )
+    # Make a NumberVector instance, containing the members, which only
+    # transmits when the '%3.1f' formatted value of a member has changed
+    temperaturevector = ThrottledNumberVector( name="temperaturevector",
+                                               label="Temperature",
+                                               group="Values",
+                                               perm="ro",
+                                               state="Ok",
+                                               numbermembers=[celsius, fahrenheit],
+                                               formatted=True )
 
     # create switch member
     chartswitchmember = ipd.SwitchMember(name="chartrequest",
@@ -0,0 +1,92 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""Micro-benchmark of the countvector of counter.py, comparing the standard
+   NumberVector with TemplateNumberVector of templates.py
+
+   For each, the six count members are incremented and send_setVector called
+   the given number of times, the sent element being captured rather than
+   served. The time per message to build the element, and to convert it to
+   bytes, by ET.tostring for the standard vector and from the rendered
+   attribute for the template vector, is printed, and the bytes checked
+   to be identical.
+
+   python templatebench.py --messages 100000
+
+   This script imports counter.py and templates.py, and assumes they are in
+   the same directory."""
+
+
+import argparse, asyncio, time
+
+from datetime import datetime, timezone
+
+import xml.etree.ElementTree as ET
+
+import counter
+
+from templates import TemplateNumberVector
+
+
+def make_template_driver():
+    "Returns the counter.py driver, with countvector replaced by a TemplateNumberVector"
+    countvector = counter.make_driver()['counter']['countvector']
+    templatevector = TemplateNumberVector( name=countvector.name,
+                                           label=countvector.label,
+                                           group=countvector.group,
+                                           perm=countvector.perm,
+                                           state=countvector.state,
+                                           numbermembers=list(countvector.data.values()) )
+    return counter.CountDriver( counter.ipd.Device( devicename="counter", properties=[templatevector] ) )
+
+
+async def runsends(driver, messages, timestamp):
+    "Send countvector messages times, return (list of elements, seconds taken)"
+    sent = []
+    async def capture(xmldata):
+        sent.append(xmldata)
+    # capture sent elements, rather than passing them to a server
+    driver.send = capture
+    countvector = driver['counter']['countvector']
+    start = time.perf_counter()
+    for n in range(messages):
+        for m in range(6):
+            countvector[f"count{m}"] = n + m
+        await countvector.send_setVector(timestamp=timestamp)
+    return sent, time.perf_counter() - start
+
+
+def tobytes(elements, rendered):
+    "Convert elements to bytes, return (list of bytes, seconds taken)"
+    start = time.perf_counter()
+    if rendered:
+        result = [element.rendered for element in elements]
+    else:
+        result = [ET.tostring(element) for element in elements]
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare NumberVector and TemplateNumberVector serialisation")
+    parser.add_argument("--messages", type=int, default=100000, help="Number of messages, default 100000")
+    args = parser.parse_args()
+
+    print(f"Running {__file__}")
+    # a fixed timestamp, so the bytes of the two methods can be compared
+    timestamp = datetime.now(tz=timezone.utc)
+    results = []
+    for name, driver, rendered in (("NumberVector", counter.make_driver(), False),
+                                   ("TemplateNumberVector", make_template_driver(), True)):
+        elements, buildtime = asyncio.run(runsends(driver, args.messages, timestamp))
+        binarydata, serialisetime = tobytes(elements, rendered)
+        results.append(binarydata)
+        print(f"{name}: build {buildtime/args.messages*1e6:.1f} us, to bytes {serialisetime/args.messages*1e6:.1f} us, "
+              f"total {(buildtime+serialisetime)/args.messages*1e6:.1f} us per message")
+    print(f"Bytes {'identical' if results[0] == results[1] else 'DIFFER'}")
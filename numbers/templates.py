@@ -0,0 +1,219 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""Vectors which send pre-rendered setVector messages
+
+   Each send_setVector of the standard vectors builds an element tree, which
+   the server then serialises with ET.tostring, walking the tree and escaping
+   every attribute and value.
+
+   TemplateNumberVector, TemplateSwitchVector, TemplateLightVector and
+   TemplateTextVector cache the fixed parts of their setVector message, the
+   start of the vector tag with its device and name, and the start and end
+   tags of each member, on first send. Subsequent sends only substitute the
+   state, timestamp, any timeout and message, and the member values.
+
+   The message is sent as a RenderedElement, an xml.etree.ElementTree.Element
+   with the usual attributes and children, so drivers, remote links and other
+   consumers see no difference, but with an added attribute 'rendered' holding
+   the bytes. A server which looks for this attribute, such as FanoutServer of
+   remotes/fanoutserver.py, writes these bytes rather than serialising the
+   element. Any other server simply serialises the element as normal.
+
+   templatebench.py compares the time per message of the two."""
+
+
+import logging
+
+import xml.etree.ElementTree as ET
+
+import indipydriver as ipd
+
+from indipydriver.propertyvectors import timestamp_string
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedElement(ET.Element):
+
+    """An Element, with attribute rendered, being the bytes which
+       ET.tostring would return for it"""
+
+    rendered = None
+
+
+def _escape_cdata(text):
+    "Escape text as ET.tostring does"
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def _escape_attrib(text):
+    "Escape an attribute value as ET.tostring does"
+    text = _escape_cdata(text)
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+
+class _TemplateVector:
+
+    """Mixin replacing send_setVector of a Number, Switch, Light or Text vector
+       with one rendering the message from cached templates"""
+
+    # set by each subclass, the set vector tag, and the member tag
+    _settag = None
+    _onetag = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the start of the vector tag, and for each member name, its start and end tags
+        self._head = None
+        self._memberparts = {}
+
+
+    def _members(self):
+        "Returns the members in the order they are sent"
+        return self.data.values()
+
+
+    def _hastimeout(self):
+        "Returns True if the timeout attribute is sent"
+        return self._perm != 'ro'
+
+
+    def _render(self, tstring, members):
+        "Returns a RenderedElement of the vector and the given members"
+        hastimeout = self._hastimeout()
+        attrib = {"device": self.devicename,
+                  "name": self.name,
+                  "state": self._state,
+                  "timestamp": tstring}
+        if hastimeout:
+            attrib["timeout"] = self._timeout
+        if self.message:
+            attrib["message"] = self.message
+        xmldata = RenderedElement(self._settag, attrib)
+        if self._head is None:
+            self._head = f'<{self._settag} device="{_escape_attrib(self.devicename)}" name="{_escape_attrib(self.name)}" state="'
+        parts = [self._head, self._state, '" timestamp="', tstring, '"']
+        if hastimeout:
+            parts.extend((' timeout="', _escape_attrib(self._timeout), '"'))
+        if self.message:
+            parts.extend((' message="', _escape_attrib(self.message), '"'))
+        if not members:
+            parts.append(" />")
+        else:
+            parts.append(">")
+            onetag = self._onetag
+            for member in members:
+                memberparts = self._memberparts.get(member.name)
+                if memberparts is None:
+                    # the attributes of the member element, its start tag, end tag, and empty tag
+                    starttag = f'<{onetag} name="{_escape_attrib(member.name)}"'
+                    memberparts = ({"name": member.name}, starttag + ">", f"</{onetag}>", starttag + " />")
+                    self._memberparts[member.name] = memberparts
+                value = member.membervalue
+                # the member element, as created by the onenumber, oneswitch etc. methods of the member
+                ET.SubElement(xmldata, onetag, memberparts[0]).text = value
+                if value:
+                    parts.extend((memberparts[1], _escape_cdata(value), memberparts[2]))
+                else:
+                    parts.append(memberparts[3])
+            parts.extend(("</", self._settag, ">"))
+        xmldata.rendered = "".join(parts).encode("us-ascii", "xmlcharrefreplace")
+        return xmldata
+
+
+    async def send_setVector(self, message='', timestamp=None, timeout=None, state=None, allvalues=True):
+        """As the send_setVector method of the parent vector, but sending a
+           RenderedElement, with its bytes rendered from cached templates."""
+        if timeout is not None and self._hastimeout():
+            self.timeout = timeout
+        self.message = message
+        if state:
+            if state in ('Idle','Ok','Busy','Alert'):
+                if state != self._state:
+                    self._state = state
+                    self.changed = True
+            else:
+                logger.error(f"Aborting sending {self._settag}: The given state must be either None or one of Idle, Ok, Busy or Alert")
+                return
+        if self._state == 'Ok':
+            # always send if state is ok, since this could be an acknowledgement, even if no items changed
+            self.changed = True
+        if not self.device.enable:
+            return
+        if not self.enable:
+            return
+        tstring = timestamp_string(timestamp)
+        if not tstring:
+            logger.error(f"Aborting sending {self._settag}: The given send_setVector timestamp must be a UTC datetime.datetime object")
+            return
+        # only send member if its value has changed or if allvalues is True
+        members = [member for member in self._members() if allvalues or member.changed]
+        for member in members:
+            member.changed = False
+        if members:
+            self.changed = True
+        if self.changed:
+            await self.driver.send(self._render(tstring, members))
+            self.changed = False
+
+
+class TemplateNumberVector(_TemplateVector, ipd.NumberVector):
+
+    "A NumberVector sending pre-rendered setNumberVector messages"
+
+    _settag = "setNumberVector"
+    _onetag = "oneNumber"
+
+
+class TemplateSwitchVector(_TemplateVector, ipd.SwitchVector):
+
+    "A SwitchVector sending pre-rendered setSwitchVector messages"
+
+    _settag = "setSwitchVector"
+    _onetag = "oneSwitch"
+
+    def _members(self):
+        "Returns the members, for rule 'OneOfMany' the standard indicates 'Off' should precede 'On'"
+        return ( [switch for switch in self.data.values() if switch.membervalue == 'Off']
+                 + [switch for switch in self.data.values() if switch.membervalue == 'On'] )
+
+
+class TemplateLightVector(_TemplateVector, ipd.LightVector):
+
+    "A LightVector sending pre-rendered setLightVector messages"
+
+    _settag = "setLightVector"
+    _onetag = "oneLight"
+
+    def _hastimeout(self):
+        "Light vectors have no timeout attribute"
+        return False
+
+
+class TemplateTextVector(_TemplateVector, ipd.TextVector):
+
+    "A TextVector sending pre-rendered setTextVector messages"
+
+    _settag = "setTextVector"
+    _onetag = "oneText"
@@ -0,0 +1,201 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""ThrottledNumberVector, a NumberVector which decides for itself what to transmit
+
+   A driver can call send_setVector as often as the hardware produces data,
+   rather than sleeping between sends to avoid flooding clients.
+
+   min_interval is the minimum number of seconds between transmissions. A
+   call made sooner is not sent immediately, instead the latest call is
+   sent when the interval expires, so the client always ends up with the
+   final value.
+
+   deadband is the smallest change of a member value, compared with the
+   value last sent, which is worth transmitting. It can be a number, or the
+   string "format", in which case each member uses the precision of its
+   format, for example 0.1 for '%3.1f', or one second for '%10.6m'.
+
+   If formatted is True, a transmission is only made if the formatted value
+   of a member, as the client would display it, differs from that last sent.
+   For slowly changing sensors this removes most updates, as successive
+   readings usually display the same.
+
+   A state change, or a message, is always sent immediately.
+
+   Run as a script, this serves a simulated sensor reading a thousand times a
+   second, which calls send_setVector on every reading."""
+
+
+import asyncio, random, re, time
+
+import indipydriver as ipd
+
+from indipyserver import IPyServer
+
+
+# precision of the sexagesimal formats, keyed on the format precision digit
+_SEXAGESIMAL = {3: 1/60, 5: 1/600, 6: 1/3600, 8: 1/36000, 9: 1/360000}
+
+
+def format_precision(numberformat):
+    """Returns the smallest change displayed by the given printf style format,
+       or 0.0 if this cannot be determined, such as for '%g' formats"""
+    match = re.fullmatch(r"%[-+ 0#]*\d*(?:\.(\d+))?([a-zA-Z])", numberformat.strip())
+    if match is None:
+        return 0.0
+    digits, conversion = match.groups()
+    if conversion in "di":
+        return 1.0
+    if conversion == "f":
+        return 10.0**-int(digits) if digits is not None else 1e-6
+    if conversion == "m" and digits is not None:
+        return _SEXAGESIMAL.get(int(digits), 0.0)
+    return 0.0
+
+
+class ThrottledNumberVector(ipd.NumberVector):
+
+    """A NumberVector with a minimum interval between transmissions,
+       a deadband below which member changes are not transmitted, and
+       optionally only sending when a formatted value has changed."""
+
+    def __init__(self, name, label, group, perm, state, numbermembers, min_interval=0, deadband=0, formatted=False):
+        super().__init__(name, label, group, perm, state, numbermembers)
+        self.min_interval = min_interval
+        self.deadband = deadband
+        self.formatted = formatted
+        # member values last transmitted, as floats and as formatted strings
+        self._sentvalues = {}
+        self._sentformatted = {}
+        # monotonic time of the last transmission
+        self._senttime = None
+        # arguments of a call awaiting the end of min_interval, and the task which will send it
+        self._pending = None
+        self._trailing = None
+
+
+    def _deadband(self, membername):
+        "Returns the deadband of the given member"
+        if self.deadband == "format":
+            return format_precision(self.data[membername].format)
+        return self.deadband
+
+
+    def significant(self):
+        """Returns True if any member has moved at least its deadband from the value last sent,
+           and if formatted is True, also has a formatted value different from that last sent"""
+        if not (self.deadband or self.formatted):
+            return True
+        for membername in self.data:
+            sent = self._sentvalues.get(membername)
+            if sent is None:
+                return True
+            if self.deadband and abs(self.getfloatvalue(membername) - sent) < self._deadband(membername):
+                continue
+            if self.formatted and self.getformattedvalue(membername) == self._sentformatted[membername]:
+                continue
+            return True
+        return False
+
+
+    async def send_setVector(self, message='', timestamp=None, timeout=None, state=None, allvalues=True):
+        """As NumberVector.send_setVector, but the call may be delayed until
+           min_interval has passed, or dropped if no member has changed by
+           more than the deadband, or has an unchanged formatted value."""
+        if (state is None or state == self.state) and not message:
+            if not self.significant():
+                # nothing worth sending, and no need for a trailing send either
+                self._pending = None
+                return
+            if self.min_interval and self._senttime is not None:
+                wait = self._senttime + self.min_interval - time.monotonic()
+                if wait > 0:
+                    # too soon, keep the latest call to be sent when the interval expires
+                    self._pending = (message, timestamp, timeout, state, allvalues)
+                    if self._trailing is None:
+                        self._trailing = asyncio.create_task(self._trailingsend(wait))
+                    return
+        await self._send(message, timestamp, timeout, state, allvalues)
+
+
+    async def _trailingsend(self, wait):
+        "Sends the pending call after waiting"
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self._trailing = None
+        if self._pending is None or self.driver.stop:
+            return
+        message, timestamp, timeout, state, allvalues = self._pending
+        if self.significant():
+            await self._send(message, timestamp, timeout, state, allvalues)
+
+
+    async def _send(self, message, timestamp, timeout, state, allvalues):
+        "Transmit, recording the values and time"
+        self._pending = None
+        self._senttime = time.monotonic()
+        for membername in self.data:
+            self._sentvalues[membername] = self.getfloatvalue(membername)
+            self._sentformatted[membername] = self.getformattedvalue(membername)
+        await super().send_setVector(message=message, timestamp=timestamp, timeout=timeout, state=state, allvalues=allvalues)
+
+
+
+class SensorDriver(ipd.IPyDriver):
+    """IPyDriver is subclassed here
+       It reads a noisy sensor a thousand times a second, and calls
+       send_setVector on every reading, the ThrottledNumberVector
+       decides what is actually transmitted"""
+
+    async def hardware(self):
+        "Read the simulated sensor every millisecond"
+        sensorvector = self['sensor']['sensorvector']
+        value = 20.0
+        while not self.stop:
+            await asyncio.sleep(0.001)
+            # a slow drift with a little noise
+            value += random.gauss(0, 0.001)
+            sensorvector['reading'] = value
+            await sensorvector.send_setVector()
+
+
+def make_driver():
+    "Returns an instance of the driver"
+
+    reading = ipd.NumberMember( name="reading",
+                                label="Reading",
+                                format="%6.2f",
+                                membervalue=20.0 )
+    # send at most twice a second, and only if the displayed value can change
+    sensorvector = ThrottledNumberVector( name="sensorvector",
+                                          label="Sensor",
+                                          group="Values",
+                                          perm="ro",
+                                          state="Ok",
+                                          numbermembers=[reading],
+                                          min_interval=0.5,
+                                          deadband="format" )
+    sensor = ipd.Device( devicename="sensor", properties=[sensorvector] )
+
+    # Create the Driver, containing this Device
+    driver = SensorDriver( sensor )
+
+    # and return the driver
+    return driver
+
+
+if __name__ == "__main__":
+
+    # serve the driver on localhost, port 7624
+    driver = make_driver()
+    server = IPyServer(driver)
+    print(f"Running {__file__}")
+    asyncio.run(server.asyncrun())
@@ -0,0 +1,168 @@
+# /// script
+# requires-python = ">=3.11"
+# ///
+
+
+"""INDIParser, an incremental parser of the INDI xml stream
+
+   The indipyserver and indipyclient packages read the stream a tag at a
+   time with readuntil(b'>'), append each piece to the message so far, test
+   the end against the expected closing tag, and then parse the complete
+   message with a new parser. Each message therefore costs many awaits,
+   repeated copying of the growing message, and the creation of a parser.
+
+   INDIParser instead keeps one xml.etree.ElementTree.XMLPullParser for the
+   life of the stream, fed with whatever blocks of data arrive. Since an
+   INDI stream has no root element, the parser is first given an <indi>
+   root, and each element completed directly beneath it is returned and
+   then removed from the root, so nothing accumulates.
+
+   Malformed data does not end the stream, the parser is restarted at the
+   next recognised message start tag after the error, discarding only the
+   message in which the error occurred, similar to the libraries.
+
+   readxml(reader) is an asynchronous generator, reading blocks from an
+   asyncio.StreamReader and yielding each message element.
+
+   Run as a script, this connects to a server on localhost port 7624 and
+   prints the tag, device and name of each message received."""
+
+
+import asyncio, re
+
+import xml.etree.ElementTree as ET
+
+
+# the start tags of INDI messages, used to find where to restart after an error
+_MESSAGESTART = re.compile(rb"<(?:def|set|new)(?:Text|Number|Switch|Light|BLOB)Vector|<(?:message|delProperty|getProperties|enableBLOB)\b")
+
+# the synthetic root given to the parser
+_ROOT = b"<indi>"
+
+
+class INDIParser:
+
+    """Incremental parser of a stream of INDI xml messages.
+       Call feed(data) with each block of bytes received, it returns a
+       list of the xml.etree.ElementTree elements completed."""
+
+    def __init__(self):
+        self.errors = 0
+        # after an error, _syncing is True until a message start tag is found,
+        # _tail holds the end of the data searched, in case it is part of a start tag
+        self._syncing = False
+        self._tail = b""
+        self._restart()
+
+
+    def _restart(self):
+        "Create a new XMLPullParser, and give it the root element"
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._depth = 0
+        self._root = None
+        # bytes and newlines fed to this parser, used to locate errors
+        self._fed = 0
+        self._lines = 0
+        self._linestart = 0
+        self._parser.feed(_ROOT)
+        self._fed = len(_ROOT)
+
+
+    def feed(self, data):
+        "Parse the block of bytes data, and return a list of completed message elements"
+        elements = []
+        while data:
+            if self._syncing:
+                data = self._tail + data
+                match = _MESSAGESTART.search(data)
+                if match is None:
+                    self._tail = data[-24:]
+                    return elements
+                self._syncing = False
+                self._tail = b""
+                data = data[match.start():]
+            chunkstart = self._fed
+            linesbefore = self._lines
+            linestartbefore = self._linestart
+            newlines = data.count(b"\n")
+            if newlines:
+                self._lines += newlines
+                self._linestart = chunkstart + data.rindex(b"\n") + 1
+            self._fed += len(data)
+            self._parser.feed(data)
+            try:
+                self._events(elements)
+                return elements
+            except ET.ParseError as e:
+                self.errors += 1
+                position = self._errorposition(e, data, chunkstart, linesbefore, linestartbefore)
+            # restart the parser, and skip to the next message start tag after the error
+            self._restart()
+            self._syncing = True
+            self._tail = b""
+            data = data[position+1:]
+        return elements
+
+
+    def _events(self, elements):
+        "Read the parser events, appending completed messages to elements"
+        for event, element in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                if self._depth == 1:
+                    self._root = element
+            else:
+                self._depth -= 1
+                if self._depth == 1:
+                    elements.append(element)
+                    # messages are removed as they complete, so at most
+                    # the one being completed is held by the root
+                    self._root.remove(element)
+
+
+    def _errorposition(self, error, data, chunkstart, linesbefore, linestartbefore):
+        "Returns the index in data of the parse error, or -1 if it is before data"
+        line, column = error.position
+        if line - 1 == linesbefore:
+            # the error is on the line which was current when data was fed
+            offset = linestartbefore + column
+        else:
+            # the error is on a later line, find its start in data
+            index = -1
+            try:
+                for n in range(line - 1 - linesbefore):
+                    index = data.index(b"\n", index+1)
+            except ValueError:
+                return -1
+            offset = chunkstart + index + 1 + column
+        return max(-1, offset - chunkstart)
+
+
+async def readxml(reader, chunksize=65536):
+    """Asynchronous generator, reading from the asyncio.StreamReader
+       and yielding each message element, until the stream ends"""
+    parser = INDIParser()
+    while True:
+        data = await reader.read(chunksize)
+        if not data:
+            return
+        for element in parser.feed(data):
+            yield element
+
+
+async def main(host="localhost", port=7624):
+    "Connect to the server, and print each message received"
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'<getProperties version="1.7" />')
+    await writer.drain()
+    try:
+        async for element in readxml(reader):
+            print(element.tag, element.get("device"), element.get("name"))
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+
+    print(f"Running {__file__}")
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipyserver"
+# ]
+# ///
+
+
+"""Benchmark of INDIParser against the parsing used by the libraries
+
+   Each recorded corpus file, repeated to give a reasonable number of
+   messages, is placed in an asyncio.StreamReader and parsed twice, firstly
+   by the _xmlinput method of the indipyserver client connection, which reads
+   a tag at a time and parses each message with ET.fromstring, and secondly
+   by readxml of indiparser.py, reading blocks of chunksize bytes. The
+   elements produced are checked to be the same, and the CPU time per
+   message printed.
+
+   A third corpus of only setNumberVector messages is made from
+   corpus/many.xml, to give the cost per setNumberVector.
+
+   python parsebench.py --messages 100000 --chunksize 4096"""
+
+
+import argparse, asyncio, pathlib, time
+
+import xml.etree.ElementTree as ET
+
+# This is not part of the public indipyserver API, its _xmlinput method
+# is the parser used by the server for each client connection
+from indipyserver.ipyserver import _ClientConnection
+
+from indiparser import INDIParser, readxml
+
+
+def make_reader(data):
+    "Returns an asyncio.StreamReader containing data"
+    reader = asyncio.StreamReader(limit=2**16)
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+async def library_parse(data, number):
+    "Parse number messages from data with the library method, return (elements, cpu seconds)"
+    connection = _ClientConnection(0, None)
+    connection.connected = True
+    connection.reader = make_reader(data)
+    elements = []
+    start = time.process_time()
+    for n in range(number):
+        elements.append(await connection._xmlinput())
+    return elements, time.process_time() - start
+
+
+async def indiparser_parse(data, chunksize):
+    "Parse all messages from data with readxml, return (elements, cpu seconds)"
+    reader = make_reader(data)
+    elements = []
+    start = time.process_time()
+    async for element in readxml(reader, chunksize):
+        elements.append(element)
+    return elements, time.process_time() - start
+
+
+def setnumber_corpus(data):
+    "Returns the setNumberVector messages of data"
+    return b"".join(ET.tostring(element) for element in INDIParser().feed(data) if element.tag == "setNumberVector")
+
+
+def runcorpus(name, data, messages, chunksize):
+    "Repeat data to give at least the number of messages, parse with both methods and print the result"
+    number = len(INDIParser().feed(data))
+    if not number:
+        print(f"{name}: no messages found")
+        return
+    repeats = max(1, messages // number)
+    data = data * repeats
+    number = number * repeats
+    libelements, libtime = asyncio.run(library_parse(data, number))
+    newelements, newtime = asyncio.run(indiparser_parse(data, chunksize))
+    same = [ET.tostring(element) for element in libelements] == [ET.tostring(element) for element in newelements]
+    print(f"{name}: {number} messages, {len(data)/1048576:.1f} MB, elements {'identical' if same else 'DIFFER'}")
+    print(f"    library _xmlinput: {libtime/number*1e6:.1f} us per message, {number/libtime:.0f} messages per CPU second")
+    print(f"    INDIParser:        {newtime/number*1e6:.1f} us per message, {number/newtime:.0f} messages per CPU second")
+    print(f"    speedup {libtime/newtime:.1f}x")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare INDIParser with the library parsing")
+    parser.add_argument("--messages", type=int, default=100000, help="Approximate number of messages per corpus, default 100000")
+    parser.add_argument("--chunksize", type=int, default=4096, help="Bytes read at a time by readxml, default 4096")
+    args = parser.parse_args()
+
+    print(f"Running {__file__}")
+    corpus = pathlib.Path(__file__).parent / "corpus"
+    for path in sorted(corpus.glob("*.xml")):
+        data = path.read_bytes()
+        runcorpus(path.name, data, args.messages, args.chunksize)
+        if path.name == "many.xml":
+            runcorpus("setNumberVector only", setnumber_corpus(data), args.messages, args.chunksize)
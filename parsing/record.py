@@ -0,0 +1,73 @@
+# /// script
+# requires-python = ">=3.11"
+# ///
+
+
+"""Records the raw INDI xml stream sent by a server to a file
+
+   Connects to the server, sends getProperties, and optionally enableBLOB
+   for every device defined, then writes every byte received to the file
+   for the given number of seconds. The recording can then be replayed by
+   parsebench.py. For example, with many.py running:
+
+   python record.py --seconds 20 corpus/many.xml
+
+   and with remotes/sendblob.py, which listens on port 7627 and sends a BLOB
+   every two minutes:
+
+   python record.py --port 7627 --blobs --seconds 140 corpus/sendblob.xml"""
+
+
+import argparse, asyncio, re, time
+
+
+_DEFDEVICE = re.compile(rb'<def\w+Vector\s[^>]*?device="([^"]+)"')
+
+
+async def record(host, port, seconds, blobs, filename):
+    "Record the stream for the given number of seconds"
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'<getProperties version="1.7" />')
+    await writer.drain()
+    enabled = set()
+    tail = b""
+    total = 0
+    end = time.monotonic() + seconds
+    try:
+        with open(filename, "wb") as fp:
+            while (remaining := end - time.monotonic()) > 0:
+                try:
+                    data = await asyncio.wait_for(reader.read(65536), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                fp.write(data)
+                total += len(data)
+                if blobs:
+                    # enable BLOBs for each device as it is defined, the end of
+                    # the previous read is included in case a tag is split
+                    for device in _DEFDEVICE.findall(tail + data):
+                        if device not in enabled:
+                            enabled.add(device)
+                            writer.write(b'<enableBLOB device="' + device + b'">Also</enableBLOB>')
+                            await writer.drain()
+                    tail = data[-512:]
+    finally:
+        writer.close()
+    return total
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Record the xml stream sent by an INDI server")
+    parser.add_argument("--host", default="localhost", help="Hostname of the server, default localhost")
+    parser.add_argument("--port", type=int, default=7624, help="Port of the server, default 7624")
+    parser.add_argument("--seconds", type=float, default=20, help="Seconds to record for, default 20")
+    parser.add_argument("--blobs", action="store_true", help="Enable BLOBs for every device")
+    parser.add_argument("filename", help="File to record to")
+    args = parser.parse_args()
+
+    print(f"Running {__file__}")
+    total = asyncio.run(record(args.host, args.port, args.seconds, args.blobs, args.filename))
+    print(f"Recorded {total} bytes to {args.filename}")
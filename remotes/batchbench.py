@@ -0,0 +1,131 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+"""Benchmark of BatchDriver batches with FanoutServer
+
+   A driver updates the given number of vectors every tick, sending each
+   with send_setVector, firstly one by one, and then within a batch. The
+   server and K clients run in this process, and for each method the
+   messages received, the writes made per client, and the CPU time used
+   per message are printed.
+
+   python batchbench.py --vectors 200 --interval 0.05 --clients 5
+
+   This script imports fanoutserver.py, and assumes it is in the same directory."""
+
+
+import argparse, asyncio, time
+
+import indipydriver as ipd
+
+from fanoutserver import BatchDriver, FanoutServer
+
+
+class _TickDriver(BatchDriver):
+
+    """BatchDriver is subclassed here, every interval each vector is
+       given a new value and sent, within a batch if usebatch is True"""
+
+    async def hardware(self):
+        "Send every vector every interval seconds"
+        interval = self.driverdata["interval"]
+        usebatch = self.driverdata["usebatch"]
+        vectors = list(self['ticker'].values())
+        count = 0
+        while not self.stop:
+            await asyncio.sleep(interval)
+            count += 1
+            if usebatch:
+                async with self.batch():
+                    for vector in vectors:
+                        vector["value"] = count
+                        await vector.send_setVector()
+            else:
+                for vector in vectors:
+                    vector["value"] = count
+                    await vector.send_setVector()
+
+
+def make_driver(vectors, interval, usebatch):
+    "Returns the driver, with a device of the given number of vectors"
+    properties = []
+    for v in range(vectors):
+        member = ipd.NumberMember( name="value", format="%d", membervalue=0 )
+        properties.append( ipd.NumberVector( name=f"vector{v}",
+                                             label=f"Vector {v}",
+                                             group="Values",
+                                             perm="ro",
+                                             state="Ok",
+                                             numbermembers=[member] ) )
+    device = ipd.Device( devicename="ticker", properties=properties )
+    return _TickDriver( device, interval=interval, usebatch=usebatch )
+
+
+async def countmessages(port, counts, index):
+    "Connect, and count the setNumberVectors received into counts[index]"
+    reader, writer = await asyncio.open_connection("localhost", port)
+    writer.write(b'<getProperties version="1.7" />')
+    await writer.drain()
+    tail = b""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            data = tail + data
+            counts[index] += data.count(b"<setNumberVector")
+            tail = data[-15:]
+    finally:
+        writer.close()
+
+
+async def runtest(args, usebatch):
+    "Run the server and clients for the duration, and print the results"
+    driver = make_driver(args.vectors, args.interval, usebatch)
+    server = FanoutServer(driver, port=args.port, maxconnections=args.clients)
+    servertask = asyncio.create_task(server.asyncrun())
+    await asyncio.sleep(0.5)
+    counts = [0]*args.clients
+    tasks = [asyncio.create_task(countmessages(args.port, counts, index)) for index in range(args.clients)]
+    # allow the definitions to pass
+    await asyncio.sleep(1)
+    startstats = server.connection_stats()
+    startcounts = list(counts)
+    startcpu = time.process_time()
+    await asyncio.sleep(args.duration)
+    cpu = time.process_time() - startcpu
+    stats = server.connection_stats()
+    received = sum(counts) - sum(startcounts)
+    writes = sum(stats[con_id]["writes"] - startstats[con_id]["writes"] for con_id in stats)
+    server.shutdown()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(servertask, *tasks, return_exceptions=True)
+    name = "batched" if usebatch else "one by one"
+    print(f"{name}: {received/args.duration:.0f} messages/s received by all clients, "
+          f"{writes/args.duration/args.clients:.0f} writes/s per client, "
+          f"{received/max(writes,1):.1f} messages per write, "
+          f"{cpu/max(received,1)*1e6:.1f} us CPU per message received")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare sending vectors one by one and in batches")
+    parser.add_argument("--vectors", type=int, default=200, help="Number of vectors sent each tick, default 200")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between ticks, default 0.05")
+    parser.add_argument("--clients", type=int, default=5, help="Number of clients, 1 to 10, default 5")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds to measure for, default 5")
+    parser.add_argument("--port", type=int, default=7624, help="Port of the server, default 7624")
+    args = parser.parse_args()
+
+    if args.clients < 1 or args.clients > 10:
+        parser.error("clients should be between 1 and 10")
+
+    print(f"Running {__file__}")
+    asyncio.run(runtest(args, False))
+    asyncio.run(runtest(args, True))
@@ -0,0 +1,162 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+"""Benchmark of BLOB fan-out, comparing IPyServer with FanoutServer
+
+   As serve_remotes.py, a server connects to a remote server with blob_enable
+   True, the remote serves a driver sending BLOBs of the given size at the
+   given interval. For each server class, with 1 and then with K BLOB
+   enabled clients, the BLOBs received per second by each client, and the
+   CPU used by the forwarding server are printed.
+
+   python fanoutbench.py --size 1024 --interval 0.02 --clients 10
+
+   CPU use is read from /proc, and so is only reported on Linux."""
+
+
+import argparse, asyncio, multiprocessing, os, time
+
+import indipydriver as ipd
+
+from indipyserver import IPyServer
+
+from fanoutserver import FanoutServer
+
+
+class _BLOBSource(ipd.IPyDriver):
+
+    """IPyDriver is subclassed here, sends a BLOB every interval"""
+
+    async def hardware(self):
+        "Sends payload bytes every interval seconds"
+        payload, interval = self.driverdata["blobinfo"]
+        blobvector = self['blobsource']['blobvector']
+        while not self.stop:
+            blobvector["blobmember"] = payload
+            await blobvector.send_setVectorMembers(members=["blobmember"])
+            await asyncio.sleep(interval)
+
+
+def runsource(port, size, interval):
+    "Runs in a child process, the remote server sending BLOBs"
+    blobmember = ipd.BLOBMember( name="blobmember",
+                                 label="Data",
+                                 blobformat=".bin")
+    blobvector = ipd.BLOBVector( name="blobvector",
+                                 label="Data",
+                                 group="Data",
+                                 perm="ro",
+                                 state="Ok",
+                                 blobmembers=[blobmember] )
+    blobdevice = ipd.Device( devicename="blobsource", properties=[blobvector] )
+    driver = _BLOBSource( blobdevice, blobinfo=(os.urandom(size*1024), interval) )
+    server = IPyServer(driver, port=port)
+    asyncio.run(server.asyncrun())
+
+
+def runforwarder(serverclass, port, remoteport, clients):
+    "Runs in a child process, the server with a blob enabled remote link"
+    server = serverclass(port=port, maxconnections=clients)
+    server.add_remote(host="localhost", port=remoteport, blob_enable=True)
+    asyncio.run(server.asyncrun())
+
+
+def cpu_seconds(pid):
+    "Return the user plus system CPU seconds used by the process, or None if unavailable"
+    try:
+        with open(f"/proc/{pid}/stat") as fp:
+            fields = fp.read().rsplit(")", maxsplit=1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return
+
+
+async def countblobs(port, counts, index, stopped):
+    "Connect, enable BLOBs, and count complete setBLOBVectors received into counts[index]"
+    endtag = b"</setBLOBVector>"
+    reader, writer = await asyncio.open_connection("localhost", port)
+    writer.write(b'<getProperties version="1.7" /><enableBLOB device="blobsource">Also</enableBLOB>')
+    await writer.drain()
+    tail = b""
+    try:
+        while not stopped.is_set():
+            data = await reader.read(1048576)
+            if not data:
+                return
+            data = tail + data
+            counts[index] += data.count(endtag)
+            tail = data[-len(endtag)+1:]
+    finally:
+        writer.close()
+
+
+async def runclients(port, clients, duration, pid):
+    "Run the clients, return BLOBs received per second for each client, and CPU use of the server"
+    stopped = asyncio.Event()
+    counts = [0]*clients
+    tasks = [asyncio.create_task(countblobs(port, counts, index, stopped)) for index in range(clients)]
+    # allow connections and BLOB enabling to settle
+    await asyncio.sleep(2)
+    startcounts = list(counts)
+    startcpu = cpu_seconds(pid)
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    endcpu = cpu_seconds(pid)
+    rates = [(counts[index]-startcounts[index])/elapsed for index in range(clients)]
+    stopped.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if startcpu is None or endcpu is None:
+        return rates, None
+    return rates, (endcpu-startcpu)/elapsed
+
+
+def runtest(serverclass, args, clients):
+    "Run the forwarding server with this number of clients, and print the results"
+    forwarder = multiprocessing.Process(target=runforwarder,
+                                        args=(serverclass, args.port, args.port+1, clients),
+                                        daemon=True)
+    forwarder.start()
+    try:
+        time.sleep(2)
+        rates, cpu = asyncio.run(runclients(args.port, clients, args.duration, forwarder.pid))
+    finally:
+        forwarder.terminate()
+        forwarder.join()
+    mbs = sum(rates) * args.size / 1024
+    result = f"{serverclass.__name__}, {clients} client(s): {min(rates):.1f} to {max(rates):.1f} BLOBs/s per client, {mbs:.1f} MB/s total"
+    if cpu is not None:
+        result += f", server CPU {cpu*100:.0f}%"
+    print(result)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compare BLOB fan-out of IPyServer and FanoutServer")
+    parser.add_argument("--size", type=int, default=1024, help="BLOB size in kB, default 1024")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between BLOBs, default 0.05")
+    parser.add_argument("--clients", type=int, default=10, help="Number of clients, 2 to 10, default 10")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to measure for, default 10")
+    parser.add_argument("--port", type=int, default=7624, help="Port of the forwarding server, the remote uses port+1, default 7624")
+    args = parser.parse_args()
+
+    if args.clients < 2 or args.clients > 10:
+        parser.error("clients should be between 2 and 10")
+
+    source = multiprocessing.Process(target=runsource, args=(args.port+1, args.size, args.interval), daemon=True)
+    source.start()
+    print(f"Running {__file__}")
+    try:
+        for serverclass in (IPyServer, FanoutServer):
+            runtest(serverclass, args, 1)
+            runtest(serverclass, args, args.clients)
+    finally:
+        source.terminate()
+        source.join()
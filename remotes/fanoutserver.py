@@ -0,0 +1,514 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+"""FanoutServer, an IPyServer which serialises each message once
+
+   IPyServer passes each message, as an xml.etree.ElementTree element, to
+   every client connection and remote link, and each of these converts it to
+   bytes itself. So a setBLOBVector sent to ten BLOB enabled clients is
+   base64 text serialised ten times.
+
+   FanoutServer gives its client connections and remote links a shared
+   encoder, the first to send a message serialises it, and the same
+   immutable bytes object is then written by every other connection.
+   The serialisation is shared, but not the buffering, the asyncio
+   transport of each connection still copies what it cannot send at once.
+   The cache is keyed weakly on the element, so holds nothing once the
+   message has been sent everywhere.
+   An element which already carries its bytes as a 'rendered' attribute,
+   such as those sent by the vectors of numbers/templates.py, is not
+   serialised at all.
+
+   Each client connection also has its own bounded outbound queue, emptied
+   by a writer task, so a stalled client, perhaps on a slow link, never
+   holds up the others, and its backlog cannot grow without limit. When a
+   queue reaches maxqueue messages the policy decides what happens:
+
+   "dropoldest" - the oldest queued set vector is discarded.
+
+   "coalesce" - a set vector replaces any earlier update of the same vector
+   still queued, its member values merged in, so the client receives the
+   latest values. If the queue is full of different vectors, the oldest is
+   dropped. While the queue is below maxqueue, nothing is coalesced.
+
+   "disconnect" - the client is disconnected.
+
+   Whatever the policy, the method coalesce(devicename, vectorname) opts
+   individual Number, Switch or Light vectors into coalescing, suitable for
+   high rate values such as a telescope position, where a client which
+   cannot keep up only needs the newest value.
+
+   An update is never coalesced into one queued before a definition or
+   deletion of the same vector, or a deletion or message of its device, so
+   the client receives these in the order they were sent.
+
+   Definitions, deletions and messages are never dropped. The method
+   connection_stats() returns queue depth and drop counts for each connected
+   client, and if statsinterval is given these are also logged every
+   statsinterval seconds.
+
+   A driver created from BatchDriver, rather than IPyDriver, can collect the
+   messages of several sends with
+
+   async with driver.batch():
+       await vector1.send_setVector()
+       await vector2.send_setVector()
+
+   and these are passed to FanoutServer together, so each client receives
+   them with a single write. With any other server they are sent one by one
+   as the batch ends.
+
+   Run as a script, this connects to remote servers led1.py, led2.py and
+   sendblob.py, as serve_remotes.py does."""
+
+
+import asyncio, collections, contextlib, logging, sys, time, weakref
+
+import xml.etree.ElementTree as ET
+
+import indipydriver as ipd
+
+from indipyserver import IPyServer, version
+
+# These are not part of the public indipyserver API, they are subclassed
+# here to change how each message is converted to bytes and queued
+from indipyserver.ipyserver import _ClientConnection, _DriverComms
+from indipyserver.remote import RemoteConnection
+
+logger = logging.getLogger(__name__)
+
+# set vectors which may be opted in to coalescing by FanoutServer.coalesce()
+_COALESCIBLE = ("setNumberVector", "setSwitchVector", "setLightVector")
+
+
+class EncodeOnce:
+    """Callable which returns the bytes of an xml element, serialising it
+       only on the first call for that element"""
+
+    def __init__(self):
+        self._cache = weakref.WeakKeyDictionary()
+        # count of serialisations, and of messages written, for reporting
+        self.encoded = 0
+        self.written = 0
+
+    def __call__(self, xmldata):
+        self.written += 1
+        # an element may carry its own bytes, see numbers/templates.py
+        binarydata = getattr(xmldata, "rendered", None)
+        if binarydata is not None:
+            return binarydata
+        binarydata = self._cache.get(xmldata)
+        if binarydata is None:
+            binarydata = ET.tostring(xmldata)
+            self._cache[xmldata] = binarydata
+            self.encoded += 1
+        return binarydata
+
+
+class _FanoutConnection(_ClientConnection):
+
+    """A client connection with a bounded outbound queue, emptied by a
+       writer task which writes the shared bytes of each message"""
+
+    def __init__(self, con_id, xml_data_que, encoder, maxqueue, policy, coalescing):
+        super().__init__(con_id, xml_data_que)
+        self.encoder = encoder
+        self.maxqueue = maxqueue
+        self.policy = policy
+        # set of (devicename, vectorname) shared with the server, vectorname
+        # being None if every vector of the device is to be coalesced
+        self.coalescing = coalescing
+        # queued entries are [key, xmldata] lists, key being (tag, device, name)
+        # for set vectors, or None for anything that must not be dropped
+        self.txque = collections.deque()
+        # for coalescing, maps key to the last queued entry of the set vector,
+        # removed when a definition, deletion or message concerning it is queued
+        self._queued = {}
+        self._txready = asyncio.Event()
+        self._txtask = None
+        self.clearstats()
+
+
+    def clearstats(self):
+        "Reset the counts, called as each new client connects"
+        self.sent = 0
+        self.writes = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.maxdepth = 0
+
+
+    def stats(self):
+        "Returns a dictionary of queue depth and counts"
+        return {"depth": len(self.txque),
+                "maxdepth": self.maxdepth,
+                "sent": self.sent,
+                "writes": self.writes,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced}
+
+
+    async def handle_data(self, reader, writer):
+        "Used by asyncio.start_server, called to handle a client connection"
+        self.txque.clear()
+        self._queued.clear()
+        self._txready.clear()
+        self.clearstats()
+        self._txtask = asyncio.create_task(self._run_tx(writer))
+        try:
+            await super().handle_data(reader, writer)
+        finally:
+            self._txtask.cancel()
+            await asyncio.gather(self._txtask, return_exceptions=True)
+            self._txtask = None
+            self.txque.clear()
+            self._queued.clear()
+
+
+    async def _client_tx(self, con_id, xmldata):
+        "Sends data from port to client, by placing it on this connection's queue"
+        self.enqueue(con_id, xmldata)
+
+
+    def enqueue(self, con_id, xmldata):
+        "Place xmldata on the outbound queue, applying the policy if the queue is full"
+        if self.con_id == con_id:
+            # do not tx data this driver is receiving
+            return
+        if not self.connected:
+            return
+        if not self.sendchecker.allowed(xmldata):
+            # this data should not be transmitted, discard it
+            return
+        if xmldata.tag.startswith("set"):
+            key = (xmldata.tag, xmldata.get("device"), xmldata.get("name"))
+            entry = self._queued.get(key)
+            if (entry is not None) and self._coalesce(key):
+                # an earlier update of this vector is still queued, replace it
+                entry[1] = _merge(entry[1], xmldata)
+                self.coalesced += 1
+                return
+        else:
+            key = None
+            if self._queued:
+                self._barrier(xmldata.get("device"), xmldata.get("name"))
+        if len(self.txque) >= self.maxqueue:
+            if self.policy == "disconnect":
+                logger.warning(f"Connection {self.con_id} disconnected, outbound queue reached {self.maxqueue} messages")
+                self.shutdown()
+                return
+            self._dropoldest()
+        entry = [key, xmldata]
+        self.txque.append(entry)
+        if key is not None:
+            self._queued[key] = entry
+        depth = len(self.txque)
+        if depth > self.maxdepth:
+            self.maxdepth = depth
+        self._txready.set()
+
+
+    def _barrier(self, devicename, vectorname):
+        """A definition, deletion or message of the device, or of the vector if vectorname
+           is given, is being queued, so earlier updates of it can no longer be coalesced"""
+        for key in list(self._queued):
+            if devicename is None or (key[1] == devicename and (vectorname is None or key[2] == vectorname)):
+                del self._queued[key]
+
+
+    def _coalesce(self, key):
+        "Returns True if this update of a set vector is to be coalesced with one still queued"
+        if self.policy == "coalesce" and len(self.txque) >= self.maxqueue:
+            return True
+        if not self.coalescing:
+            return False
+        tag, devicename, vectorname = key
+        if tag not in _COALESCIBLE:
+            return False
+        return ((devicename, vectorname) in self.coalescing) or ((devicename, None) in self.coalescing)
+
+
+    def _dropoldest(self):
+        "Discard the oldest queued set vector, if any"
+        for entry in self.txque:
+            if entry[0] is not None:
+                break
+        else:
+            # nothing can be dropped, so the queue is allowed to exceed maxqueue
+            return
+        self.txque.remove(entry)
+        if self._queued.get(entry[0]) is entry:
+            del self._queued[entry[0]]
+        self.dropped += 1
+
+
+    async def _run_tx(self, writer):
+        "Writer task, sends everything queued with a single write, then waits for the drain"
+        try:
+            while True:
+                await self._txready.wait()
+                self._txready.clear()
+                if not self.txque:
+                    continue
+                entries = list(self.txque)
+                self.txque.clear()
+                self._queued.clear()
+                # the bytes objects are serialised once and shared with every
+                # other connection, though the transport still copies them into
+                # its own buffer, so each connection holds its own pending copy
+                writer.writelines([self.encoder(entry[1]) for entry in entries])
+                self.sent += len(entries)
+                self.writes += 1
+                await writer.drain()
+        except ConnectionError:
+            self.shutdown()
+
+
+def _merge(older, newer):
+    """Returns newer, with any members of older, which newer does not have,
+       added, so sending a subset of members does not lose earlier values"""
+    names = set(member.get("name") for member in newer)
+    missing = [member for member in older if member.get("name") not in names]
+    if not missing:
+        return newer
+    # newer may be shared with other connections, so do not alter it
+    merged = ET.Element(newer.tag, newer.attrib)
+    merged.text = newer.text
+    merged.extend(missing)
+    merged.extend(newer)
+    return merged
+
+
+class _FanoutRemote(RemoteConnection):
+
+    "A remote link writing the shared bytes of each message"
+
+    def __init__(self, host, port, blob_enable, debug_enable, encoder):
+        super().__init__(host=host, port=port, blob_enable=blob_enable, debug_enable=debug_enable)
+        self.encoder = encoder
+
+
+    async def send(self, xmldata):
+        """Transmits xmldata, which is an xml.etree.ElementTree object out on the remote connection"""
+        if not self.connected:
+            return
+        if self._stop:
+            return
+        try:
+            if not self.blob_enable:
+                if (xmldata.tag == "setBLOBVector") or  (xmldata.tag == "newBLOBVector"):
+                    # blobs not enabled
+                    return
+            # send it out on the port
+            self._writer.write(self.encoder(xmldata))
+            await self._writer.drain()
+            # data has been transmitted
+            if logger.isEnabledFor(logging.DEBUG):
+                self._logtx(xmldata)
+        except Exception:
+            logger.exception(f"Sending error from RemoteConnection.send method for {self.indihost}:{self.indiport}")
+            await self._clear_connection()
+
+
+class _FanoutDriverComms(_DriverComms):
+
+    "As _DriverComms, with the addition of sending a batch of messages"
+
+    async def run_tx_batch(self, xmldatalist):
+        """Places a list of xml elements generated by the driver into xml_data_que
+           as a single item, with this connection id"""
+        await self.xml_data_que.put( (self.con_id, xmldatalist) )
+        await asyncio.sleep(0)
+
+
+class BatchDriver(ipd.IPyDriver):
+
+    """An IPyDriver with a batch() context, the messages of any sends
+       made within the context are sent together as it closes."""
+
+    # a list of messages while a batch is being collected
+    _batch = None
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Async context manager, collecting sends until it closes.
+           Any other task of this driver sending during the batch is
+           also collected. Nested batches join the outer batch."""
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            xmldatalist = self._batch
+            self._batch = None
+            await self._sendbatch(xmldatalist)
+
+
+    async def _sendbatch(self, xmldatalist):
+        "Send the collected messages"
+        if not xmldatalist or self._stop:
+            return
+        if len(xmldatalist) > 1 and hasattr(self._commsobj, "run_tx_batch"):
+            await self._commsobj.run_tx_batch(xmldatalist)
+            if logger.isEnabledFor(logging.DEBUG) and self.debug_enable:
+                for xmldata in xmldatalist:
+                    logger.debug(f"TX:: {ET.tostring(xmldata).decode('utf-8')}")
+        else:
+            # the server does not accept batches, so send one by one
+            for xmldata in xmldatalist:
+                await super().send(xmldata)
+
+
+    async def send(self, xmldata):
+        "Transmits xmldata, or if a batch is being collected, adds it to the batch"
+        if self._batch is not None:
+            self._batch.append(xmldata)
+            return
+        await super().send(xmldata)
+
+
+class FanoutServer(IPyServer):
+
+    """As IPyServer, but each message is serialised once, and the same
+       bytes written to every client connection and remote link.
+
+       Each client connection has an outbound queue of up to maxqueue
+       messages, policy being one of "dropoldest", "coalesce" or
+       "disconnect", which sets what happens when it is full.
+       If statsinterval is given, queue statistics are logged at INFO
+       level every statsinterval seconds."""
+
+    def __init__(self, *drivers, host="localhost", port=7624, maxconnections=5,
+                       maxqueue=256, policy="dropoldest", statsinterval=0):
+        super().__init__(*drivers, host=host, port=port, maxconnections=maxconnections)
+        if maxqueue < 1:
+            raise ValueError("maxqueue must be at least 1")
+        if policy not in ("dropoldest", "coalesce", "disconnect"):
+            raise ValueError('policy must be one of "dropoldest", "coalesce" or "disconnect"')
+        self.maxqueue = maxqueue
+        self.policy = policy
+        self.statsinterval = statsinterval
+        self.coalescing = set()
+        self.encoder = EncodeOnce()
+        # replace the pool of client connections
+        self.connectionpool = [_FanoutConnection(clientconnection.con_id, self.xml_data_que,
+                                                 self.encoder, maxqueue, policy, self.coalescing)
+                                                 for clientconnection in self.connectionpool]
+        # and the driver comms objects, keeping their con_id
+        for driver in self.drivers:
+            driver._commsobj = _FanoutDriverComms(driver, driver._commsobj.con_id, self.xml_data_que)
+
+
+    def coalesce(self, devicename, vectorname=None):
+        """Opt in a Number, Switch or Light vector to coalescing, so an update
+           still queued for a client is replaced by the newer one. If
+           vectorname is None, all such vectors of the device are coalesced."""
+        self.coalescing.add((devicename, vectorname))
+
+
+    def connection_stats(self):
+        """Returns a dictionary of con_id to a dictionary of depth, maxdepth,
+           sent, writes, dropped and coalesced counts, for each connected client"""
+        return {clientconnection.con_id: clientconnection.stats()
+                for clientconnection in self.connectionpool if clientconnection.connected}
+
+
+    async def _logstats(self):
+        "Log connection statistics every statsinterval seconds"
+        while not self._stop:
+            await asyncio.sleep(self.statsinterval)
+            for con_id, stats in self.connection_stats().items():
+                logger.info(f"Connection {con_id}: " + ", ".join(f"{key} {value}" for key, value in stats.items()))
+
+
+    async def _broadcast(self):
+        """As IPyServer._broadcast, but client connections are given data directly,
+           rather than by a task per message, and batches from a BatchDriver are unpacked"""
+        if self.statsinterval:
+            self._tg.create_task( self._logstats() )
+        timeout = time.time()+self.keepalive
+        try:
+            while not self._stop:
+                await asyncio.sleep(0)
+                if self.keepalive:
+                    current_time = time.time()
+                    if current_time > timeout:
+                        timeout = current_time + self.keepalive
+                        self._send_keepalive()
+                try:
+                    quedata = await asyncio.wait_for(self.xml_data_que.get(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                self.xml_data_que.task_done()
+                if self._stop:
+                    return
+                con_id, xmldata = quedata
+                # xmldata may be a list, a batch from a BatchDriver
+                xmldatalist = xmldata if isinstance(xmldata, list) else [xmldata]
+                for xmldata in xmldatalist:
+                    # data to send, therefore increase keepalive timeout
+                    # however, do not increase it if this is a setBLOBVector, as these may be blocked
+                    if xmldata.tag != "setBLOBVector":
+                        timeout = time.time()+self.keepalive
+                    for driver in self.drivers:
+                        # send data to the drivers
+                        self._tg.create_task( driver._commsobj.driver_rx(con_id, xmldata) )
+                    for exdriver in self.exdrivers:
+                        # send data to the external drivers
+                        self._tg.create_task( exdriver._commsobj.driver_rx(con_id, xmldata) )
+                    for remcon in self.remotes:
+                        self._tg.create_task( remcon._commsobj.driver_rx(con_id, xmldata) )
+                    for clientconnection in self.connectionpool:
+                        # queue data for clients, a batch is queued without awaiting,
+                        # so each writer task sends it with one write
+                        clientconnection.enqueue(con_id, xmldata)
+        finally:
+            self.shutdown()
+
+
+    def add_remote(self, host, port, blob_enable=False, debug_enable=False):
+        """Adds a connection to a remote server.
+           blob_enable can be True or False.
+           If True BLOBs and other vectors can all be sent.
+           If False, then BLOB traffic will not pass over this link.
+
+           If debug_enable is True, then DEBUG level logging will record xml
+           traffic, if False, the xml traffic will not be logged."""
+
+        remcon = _FanoutRemote( host=host, port=port,
+                                blob_enable = blob_enable,
+                                debug_enable = debug_enable,
+                                encoder = self.encoder )
+
+        # Create a DriverComms object
+        self.con_id += 1
+        remcon._commsobj = _FanoutDriverComms(remcon, self.con_id, self.xml_data_que)
+        # store this object
+        self.remotes.append(remcon)
+
+
+if __name__ == "__main__":
+
+    # log queue statistics to stdout
+    rootlogger = logging.getLogger()
+    rootlogger.setLevel(logging.INFO)
+    rootlogger.addHandler(logging.StreamHandler(sys.stdout))
+
+    # a client which falls more than 256 messages behind receives only the
+    # latest values of each vector, queue statistics are logged every minute
+    server = FanoutServer(host="localhost", port=7624, maxconnections=5,
+                          maxqueue=256, policy="coalesce", statsinterval=60)
+
+    # connect to remote servers, with blob enabled on all links
+    server.add_remote(host="localhost", port=7625, blob_enable=True)
+    server.add_remote(host="localhost", port=7626, blob_enable=True)
+    server.add_remote(host="localhost", port=7627, blob_enable=True)
+    print(f"Running {__file__} with indipyserver version {version}")
+    asyncio.run(server.asyncrun())
@@ -0,0 +1,29 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipyserver"
+# ]
+# ///
+
+"""As serve_remotes.py, but connects to unixsocket.py, which serves the
+   led1 device on the Unix socket /tmp/indi_led1.sock. This server listens
+   on TCP port 7624, so clients such as indipyterm see the led1 device, and
+   also on the Unix socket /tmp/indi.sock, to which local clients such as
+   UnixClient or UnixQueClient of unixsocket.py can connect.
+   This imports unixsocket.py, and assumes it is in the same directory."""
+
+
+import asyncio
+from indipyserver import version
+
+from unixsocket import UnixServer
+
+
+if __name__ == "__main__":
+
+    server = UnixServer(path="/tmp/indi.sock", host="localhost", port=7624, maxconnections=5)
+
+    # connect to the remote server listening on a Unix socket
+    server.add_remote(path="/tmp/indi_led1.sock", blob_enable=True)
+    print(f"Running {__file__} with indipyserver version {version}")
+    asyncio.run(server.asyncrun())
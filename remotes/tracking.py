@@ -0,0 +1,81 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""A simulated mount, sending its position at 50 Hz
+
+   Served by FanoutServer with the position vector opted in to coalescing,
+   so a client which cannot keep up with fifty updates a second, perhaps
+   a GUI on a slow link, is sent only the newest position rather than a
+   growing backlog of old ones.
+
+   This script imports fanoutserver.py, and assumes it is in the same directory."""
+
+
+import asyncio, math
+
+import indipydriver as ipd
+
+from fanoutserver import FanoutServer
+
+
+class TrackingDriver(ipd.IPyDriver):
+    """IPyDriver is subclassed here
+       It has device 'mount' with a ro vector 'position'
+       giving ra and dec, updated and sent every 20ms"""
+
+    async def hardware(self):
+        """Sends the position vector fifty times a second"""
+
+        position = self['mount']['position']
+        ra = 0.0
+        t = 0.0
+        while not self.stop:
+            await asyncio.sleep(0.02)
+            t += 0.02
+            # ra advances at the sidereal rate, dec has a small oscillation
+            ra = (ra + 0.02/3590.17) % 24
+            position['ra'] = ra
+            position['dec'] = 45.0 + 0.01*math.sin(t)
+            await position.send_setVector()
+
+
+def make_driver():
+    "Returns an instance of the driver"
+
+    ra = ipd.NumberMember( name="ra",
+                           label="RA (hh:mm:ss)",
+                           format="%010.6m",
+                           membervalue=0.0 )
+    dec = ipd.NumberMember( name="dec",
+                            label="DEC (dd:mm:ss)",
+                            format="%010.6m",
+                            membervalue=45.0 )
+    position = ipd.NumberVector( name="position",
+                                 label="Position",
+                                 group="Tracking",
+                                 perm="ro",
+                                 state="Ok",
+                                 numbermembers=[ra, dec] )
+    mount = ipd.Device( devicename="mount", properties=[position] )
+
+    # Create the Driver, containing this Device
+    driver = TrackingDriver( mount )
+
+    # and return the driver
+    return driver
+
+
+if __name__ == "__main__":
+
+    driver = make_driver()
+    server = FanoutServer(driver, host="localhost", port=7624)
+    # a client which falls behind receives only the latest position
+    server.coalesce("mount", "position")
+    print(f"Running {__file__}")
+    asyncio.run(server.asyncrun())
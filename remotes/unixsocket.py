@@ -0,0 +1,306 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver",
+#     "indipyclient"
+# ]
+# ///
+
+"""Unix domain sockets as an alternative to TCP, for IPyServer, its remote
+   links, and IPyClient and QueClient
+
+   Where every client is on the same machine as the server, a Unix domain
+   socket avoids the TCP stack for each message, and access is controlled
+   by the permissions of the socket file rather than by exposing a port.
+
+   UnixServer is an IPyServer which, given path, also listens on a Unix
+   socket at path, created with file permissions mode. It listens on TCP
+   host and port as IPyServer does, unless port is None. Client connections
+   on either share the maxconnections pool. A stale socket file left at
+   path is removed when UnixServer is created, but if a server is answering
+   on it, OSError is raised there. If one starts answering on it before
+   asyncrun, asyncrun logs the error and returns. The socket file is removed
+   on shutdown.
+
+   UnixServer.add_remote takes path as an alternative to host and port,
+   giving a remote link to a server listening on a Unix socket.
+
+   UnixClientMixin, added to IPyClient or its subclasses, connects to path
+   rather than to a TCP port. UnixClient and UnixQueClient are created with
+   it, and rununixqueclient is the equivalent of runqueclient. Their indihost
+   and indiport are set to "unix" and the path, so messages such as
+   "Connected to unix:/tmp/indi.sock" name the socket.
+
+   Run as a script, this serves the simulated LED of led1.py on a Unix socket
+   at /tmp/indi_led1.sock only, and serve_unix_remote.py connects to it."""
+
+
+import asyncio, logging, os, socket, stat, time
+
+from indipyclient import IPyClient, events
+from indipyclient.queclient import QueClient
+
+from indipyserver import IPyServer, version
+from indipyserver.remote import RemoteConnection
+# Not part of the public indipyserver API, used to join a remote link to the server
+from indipyserver.ipyserver import _DriverComms
+
+logger = logging.getLogger(__name__)
+
+
+def _clear_stale(path):
+    """Removes a socket file left at path by a server which has stopped,
+       raises OSError if a server is answering on it"""
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError(f"{path} exists and is not a socket")
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # nothing is listening, so the file is stale
+            os.unlink(path)
+            return
+    raise OSError(f"A server is already listening on {path}")
+
+
+class UnixServer(IPyServer):
+
+    """An IPyServer which also listens on a Unix domain socket at path, if
+       given, and on TCP host and port unless port is None."""
+
+    def __init__(self, *drivers, path=None, host="localhost", port=7624, maxconnections=5, mode=0o660):
+        if path is None and port is None:
+            raise ValueError("Either a path or a port should be given")
+        if path is not None:
+            # raises OSError here, rather than in asyncrun, if a server is answering on path
+            _clear_stale(path)
+        super().__init__(*drivers, host=host, port=port, maxconnections=maxconnections)
+        self.path = path
+        self.mode = mode
+        # the listening servers
+        self._servers = []
+
+
+    def shutdown(self, shutdownmessage=""):
+        """Shuts down the server, sets the flag self._stop to True
+           and sends shutdownmessage to logger.error if given"""
+        super().shutdown(shutdownmessage)
+        for server in self._servers:
+            server.close()
+
+
+    def _bind(self):
+        """Returns a socket bound to self.path, the socket file being created
+           with permissions mode, so it is never open to others"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the umask is process wide, but no other task of the event loop runs while it is set
+        oldmask = os.umask(0o777 & ~self.mode)
+        try:
+            sock.bind(self.path)
+        except Exception:
+            sock.close()
+            raise
+        finally:
+            os.umask(oldmask)
+        # the umask can only remove permissions, so set mode exactly
+        os.chmod(self.path, self.mode)
+        return sock
+
+
+    async def _runserver(self):
+        "Runs the server on the given path, and on the host and port if port is given"
+        try:
+            if self.path is not None:
+                _clear_stale(self.path)
+                unixserver = await asyncio.start_unix_server(self.handle_data, sock=self._bind())
+                self._servers.append(unixserver)
+                logger.info(f"{self.__class__.__name__} listening on {self.path}")
+            if self.port is not None:
+                tcpserver = await asyncio.start_server(self.handle_data, self.host, self.port)
+                self._servers.append(tcpserver)
+                logger.info(f"{self.__class__.__name__} listening on {self.host} : {self.port}")
+            # IPyServer.shutdown closes self.server
+            self.server = self._servers[0]
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        finally:
+            self.shutdown()
+            if self.path is not None and self._servers:
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+
+
+    def add_remote(self, host=None, port=None, blob_enable=False, debug_enable=False, path=None):
+        """Adds a connection to a remote server, as IPyServer.add_remote, or if path
+           is given, to a remote server listening on a Unix socket at path."""
+        if path is None:
+            super().add_remote(host, port, blob_enable, debug_enable)
+            return
+        remcon = UnixRemoteConnection(path,
+                                      blob_enable = blob_enable,
+                                      debug_enable = debug_enable )
+        # Create a DriverComms object
+        self.con_id += 1
+        remcon._commsobj = _DriverComms(remcon, self.con_id, self.xml_data_que)
+        # store this object
+        self.remotes.append(remcon)
+
+
+class UnixRemoteConnection(RemoteConnection):
+
+    "A remote link to a server listening on a Unix socket at path"
+
+    def __init__(self, path, blob_enable, debug_enable):
+        super().__init__("unix", path, blob_enable, debug_enable)
+        self.path = path
+
+
+    async def _create_connection(self):
+        "Create a connection to the Unix socket"
+        try:
+            while not self._stop:
+                try:
+                    # start by openning a connection
+                    await self.warning(f"Attempting to connect to unix:{self.path}")
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    await self.warning(f"Connected to unix:{self.path}")
+                    await self._run_rx()
+                except (ConnectionRefusedError, FileNotFoundError):
+                    await self.warning(f"Connection refused on unix:{self.path}")
+                except ConnectionError:
+                    await self.warning(f"Connection Lost on unix:{self.path}")
+                except OSError:
+                    await self.warning(f"Connection Error on unix:{self.path}")
+                except Exception:
+                    logger.exception(f"Connection Error on unix:{self.path}")
+                    await self.warning("Connection failed")
+                await self._clear_connection()
+                if self._stop:
+                    break
+                else:
+                    await self.warning("Connection failed, re-trying...")
+                # wait five seconds before re-trying, but keep checking
+                # that self._stop has not been set
+                count = 0
+                while not self._stop:
+                    await asyncio.sleep(0.5)
+                    count += 1
+                    if count >= 10:
+                        break
+        except Exception:
+            logger.exception("Exception report from UnixRemoteConnection._create_connection method")
+            raise
+        finally:
+            await self._clear_connection()
+            self.shutdown()
+
+
+class UnixClientMixin:
+
+    """Mixin for IPyClient and its subclasses, which if self.path is set,
+       connects to a Unix socket at path rather than to indihost and indiport."""
+
+    # the path of the Unix socket, or None to connect with TCP
+    path = None
+
+
+    async def _comms(self):
+        "As IPyClient._comms, but if self.path is set, connects to the Unix socket"
+        if self.path is None:
+            await super()._comms()
+            return
+        try:
+            while not self._stop:
+                self.tx_timer = None
+                self.idle_timer = time.time()
+                t2 = None
+                t3 = None
+                try:
+                    # start by openning a connection
+                    await self.warning(f"Attempting to connect to unix:{self.path}")
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    self.messages.clear()
+                    # clear devices etc
+                    self.clear()
+                    await self.warning(f"Connected to unix:{self.path}")
+                    await self.rxevent(events.ConnectionMade())
+                    t2 = asyncio.create_task(self._run_rx())
+                    t3 = asyncio.create_task(self._check_alive())
+                    await asyncio.gather(t2, t3)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    await self.warning(f"Connection refused on unix:{self.path}")
+                except ConnectionError:
+                    await self.warning(f"Connection Lost on unix:{self.path}")
+                except OSError:
+                    await self.warning(f"Connection Error on unix:{self.path}")
+                except Exception:
+                    logger.exception(f"Connection Error on unix:{self.path}")
+                    await self.warning("Connection failed")
+                await self._clear_connection()
+                # connection has failed, ensure all tasks are done
+                if t2:
+                    while not t2.done():
+                        await asyncio.sleep(0)
+                if t3:
+                    while not t3.done():
+                        await asyncio.sleep(0)
+                if self._stop:
+                    break
+                else:
+                    await self.warning("Connection failed, re-trying...")
+                # wait five seconds before re-trying, but keep checking
+                # that self._stop has not been set
+                count = 0
+                while not self._stop:
+                    await asyncio.sleep(0.5)
+                    count += 1
+                    if count >= 10:
+                        break
+        except Exception:
+            logger.exception("Exception report from UnixClientMixin._comms method")
+            raise
+        finally:
+            await self._clear_connection()
+            self.shutdown()
+
+
+class UnixClient(UnixClientMixin, IPyClient):
+
+    "An IPyClient connecting to a server listening on a Unix socket at path"
+
+    def __init__(self, path, **clientdata):
+        super().__init__("unix", path, **clientdata)
+        self.path = path
+
+
+class UnixQueClient(UnixClientMixin, QueClient):
+
+    "A QueClient connecting to a server listening on a Unix socket at path"
+
+    def __init__(self, txque, rxque, path, blobfolder=None):
+        super().__init__(txque, rxque, "unix", path, blobfolder)
+        self.path = path
+
+
+def rununixqueclient(txque, rxque, path, blobfolder=None):
+    """Blocking call which creates a UnixQueClient object and runs its asyncrun method,
+       as runqueclient of indipyclient.queclient"""
+    client = UnixQueClient(txque, rxque, path, blobfolder)
+    asyncio.run(client.asyncrun())
+
+
+if __name__ == "__main__":
+
+    # This imports led1.py, and assumes it is in the same directory.
+    from led1 import LED, make_driver
+
+    driver = make_driver(LED(17))
+    # listen on the Unix socket only
+    server = UnixServer(driver, path="/tmp/indi_led1.sock", port=None)
+    print(f"Running {__file__} with indipyserver version {version}")
+    asyncio.run(server.asyncrun())
@@ -0,0 +1,221 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipyclient",
+#     "indipyserver"
+# ]
+# ///
+
+
+"""Loopback, joining an IPyClient or QueClient to an IPyServer in the same
+   process, without a socket
+
+   Where the client and the drivers run on the same machine, they would
+   normally still talk over a localhost TCP connection, each message being
+   serialised to XML text by the server and parsed again by the client.
+
+   A client created from LoopbackMixin, such as LoopbackClient or
+   LoopbackQueClient, and joined to a server with
+
+   add_loopback(server, client)
+
+   is instead passed the xml.etree.ElementTree elements the drivers send,
+   as they are passed to each connection of the server, and the client
+   creates its events from them directly. Elements the client sends, such as
+   getProperties and new vectors, are placed on the server queue in the same
+   way, so nothing is serialised or parsed, and there is no socket.
+
+   The link is held in the list of remote links of the server, as
+   server.add_remote does, so the server runs the client, and shuts it
+   down, with its remotes. Do not also await client.asyncrun(). The server
+   still listens on its port for other clients.
+
+   As the server, drivers and client share one event loop, the order of
+   messages is fixed, which also suits tests of a driver and client together.
+
+   The mixin can be added to other IPyClient subclasses, for example
+   loopbackclient.py uses it with the SharedQueClient of sharedqueclient.py,
+   and the JSONClient of indipyweb/jsonapi.py is built on it, its add_jsonapi
+   joining a subclass of _Loopback which also runs the HTTP service.
+   A client created from the mixin, but not joined to a server, connects
+   over TCP as normal.
+
+   Run as a script, this serves the Counter driver of simpledriver.py and
+   a LoopbackClient printing each event received."""
+
+
+import asyncio, time
+
+from indipyclient import IPyClient, events
+from indipyclient.queclient import QueClient
+
+# These are not part of the public indipyserver API, they are used by add_loopback
+# to join a client to an IPyServer, as the server joins its own connections
+from indipyserver.ipyserver import SendChecker, _DriverComms
+
+
+class LoopbackMixin:
+
+    """Mixin for IPyClient and its subclasses, which if joined to an IPyServer
+       by add_loopback, uses an in-memory link to the server in place of a socket."""
+
+    # a _Loopback if joined to an IPyServer, otherwise None
+    _link = None
+
+
+    async def _comms(self):
+        "As IPyClient._comms, but if joined to an IPyServer, uses the link rather than a socket"
+        if self._link is None:
+            await super()._comms()
+            return
+        try:
+            while not self._stop:
+                self.tx_timer = None
+                self.idle_timer = time.time()
+                self.messages.clear()
+                # clear devices etc
+                self.clear()
+                # the link takes the place of the writer, so self.connected is True
+                self._writer = self._link
+                await self.rxevent(events.ConnectionMade())
+                # this returns when the client is stopped, or if the server does not respond
+                await self._check_alive()
+                if self._stop:
+                    break
+                await self.warning("Connection failed, re-trying...")
+                # wait five seconds before re-trying, but keep checking
+                # that self._stop has not been set
+                count = 0
+                while not self._stop:
+                    await asyncio.sleep(0.5)
+                    count += 1
+                    if count >= 10:
+                        break
+        finally:
+            await self._clear_connection()
+            self.shutdown()
+
+
+    async def _clear_connection(self):
+        "As IPyClient._clear_connection, but if joined to an IPyServer, only drops the link"
+        if self._link is None:
+            await super()._clear_connection()
+            return
+        if self._writer is not None:
+            self._writer = None
+            await self.rxevent(events.ConnectionLost())
+        self.tx_timer = None
+
+
+    async def send(self, xmldata):
+        "As IPyClient.send, but if joined to an IPyServer, passes xmldata to the server without serialising it"
+        if self._link is None:
+            await super().send(xmldata)
+            return
+        if not self.connected or self._stop:
+            return
+        if self.timeout_enable and (self.tx_timer is None) and (xmldata.tag != "enableBLOB"):
+            self.tx_timer = time.time()
+        self.idle_timer = time.time()
+        await self._link.send(xmldata)
+
+
+class LoopbackClient(LoopbackMixin, IPyClient):
+    "An IPyClient which can be joined to an IPyServer in the same process with add_loopback"
+    pass
+
+
+class LoopbackQueClient(LoopbackMixin, QueClient):
+    "A QueClient which can be joined to an IPyServer in the same process with add_loopback"
+    pass
+
+
+class _Loopback:
+
+    """Joins a client to an IPyServer in the same process. It is held in the
+       list of remotes of the server, so the server passes it every element,
+       and runs and shuts it down with its remote links."""
+
+    def __init__(self, client):
+        self.client = client
+        # enableBLOB instructions from the client are held here, as for a client connection
+        self.sendchecker = SendChecker()
+        # An object for communicating is set when this link is added to the server
+        self._commsobj = None
+
+
+    def __contains__(self, item):
+        "No devices are served by the link, so definitions are never duplicates"
+        return False
+
+
+    async def _readdata(self, xmldata):
+        "Called by the server with each element, which is passed to the client if allowed"
+        client = self.client
+        if not client.connected or client.stop:
+            return
+        if not self.sendchecker.allowed(xmldata):
+            return
+        # as IPyClient._datainput, reset the timers on receiving data
+        client.tx_timer = None
+        client.idle_timer = time.time()
+        await client._rxhandler(xmldata)
+
+
+    async def send(self, xmldata):
+        "Called by the client, passes xmldata to the server"
+        if xmldata.tag == "enableBLOB":
+            # set permission flags in the sendchecker object, this is not broadcast
+            self.sendchecker.setpermissions(xmldata)
+            return
+        await self._commsobj.run_tx(xmldata)
+
+
+    def shutdown(self):
+        "Called by the server on shutdown"
+        self.client.shutdown()
+
+
+    async def asyncrun(self):
+        "Called by the server, runs the client"
+        await self.client.asyncrun()
+
+
+def add_loopback(server, client):
+    """Joins client, created from LoopbackMixin, to the IPyServer server in the
+       same process, to run when the server runs. Call before server.asyncrun()"""
+    if not isinstance(client, LoopbackMixin):
+        raise TypeError("The client should be created from a class using LoopbackMixin")
+    _join(server, _Loopback(client))
+
+
+def _join(server, link):
+    "Joins link, a _Loopback or a subclass of it, and its client, to the server"
+    link.client._link = link
+    # Create a DriverComms object, as server.add_remote does
+    server.con_id += 1
+    link._commsobj = _DriverComms(link, server.con_id, server.xml_data_que)
+    server.remotes.append(link)
+
+
+class _PrintClient(LoopbackClient):
+
+    async def rxevent(self, event):
+        "Print each event"
+        print(event.eventtype, event.devicename, event.vectorname)
+
+
+if __name__ == "__main__":
+
+    # This imports simpledriver.py, and assumes it is in the same directory.
+    from indipyserver import IPyServer
+    from simpledriver import make_driver
+
+    server = IPyServer(make_driver())
+    add_loopback(server, _PrintClient())
+
+    print(f"Running {__file__}")
+    try:
+        asyncio.run(server.asyncrun())
+    except KeyboardInterrupt:
+        print("Shutting down")
@@ -0,0 +1,69 @@
+# /// script
+# requires-python = ">=3.11"
+# dependencies = [
+#     "indipydriver>=3.0.2",
+#     "indipyserver",
+#     "indipyclient",
+# ]
+# ///
+
+import asyncio, collections, threading
+
+from indipyserver import IPyServer
+
+# As threadedclient.py, but rather than connecting to simpledriver.py over a
+# socket, the Counter driver and the IPyServer are run in this script, with
+# the SharedQueClient joined to the server in-process by loopback.py.
+# This imports simpledriver.py, sharedqueclient.py, loopback.py and
+# threadedclient.py, and assumes they are in the same directory.
+from simpledriver import make_driver
+from sharedqueclient import SharedQueClient
+from loopback import LoopbackMixin, add_loopback
+from threadedclient import numberdoubler
+
+
+class LoopbackSharedQueClient(LoopbackMixin, SharedQueClient):
+    "A SharedQueClient which can be joined to an IPyServer with add_loopback"
+    pass
+
+
+async def runserver(server, client):
+    "Run the server, which runs the client, until the client is stopped"
+    servertask = asyncio.create_task(server.asyncrun())
+    await client.stopped.wait()
+    server.shutdown()
+    await servertask
+
+
+if __name__ == "__main__":
+
+    # create queue where updated data will be transmitted
+    txque = collections.deque()
+    # create queue where client will put events
+    rxque = collections.deque()
+
+    server = IPyServer(make_driver())
+    # delta and subscribe as threadedclient.py
+    client = LoopbackSharedQueClient(txque, rxque, delta=True, subscribe=[("Counter", "txcount")])
+    add_loopback(server, client)
+
+    # run the server, driver and client in their own thread
+    serverthread = threading.Thread(target=asyncio.run, args=(runserver(server, client),))
+    serverthread.start()
+
+    print(f"Running {__file__}")
+
+    try:
+
+        # call blocking function
+        numberdoubler(txque, rxque)
+
+    except KeyboardInterrupt:
+        # normal shutdown, dont bother displaying any output trace
+        print("Shutting down")
+
+    finally:
+        # if this stops, shutdown queclient, which then stops the server
+        txque.append(None)
+        # and wait for the thread to stop
+        serverthread.join()
@@ -0,0 +1,313 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "indipyclient",
+# ]
+# ///
+
+
+"""SharedQueClient, a QueClient whose event snapshots share unchanged parts
+
+   The QueClient of indipyclient places an EventItem on rxque for every event,
+   with a full snapshot of the client, so each incoming message costs a copy
+   of every device, vector and member.
+
+   SharedQueClient records which vectors each event has changed, and when the
+   next snapshot is taken, only new copies of those vectors are made. Every
+   unchanged vector snapshot, and every device snapshot of a device with no
+   changes, is the same object as in the previous snapshot. Snapshot cost is
+   therefore proportional to the vectors changed, rather than all vectors.
+
+   Since parts are shared between snapshots, they must be treated as read
+   only. The mappings of the snapshots are read only views, so devices,
+   vectors and members cannot be added or removed, however attributes and
+   member values could still be altered, and should not be.
+
+   Changes made other than by received events, for example by calling
+   client.set_user_string, are not tracked; call client.invalidate() after
+   such a change so the next snapshot is a full copy.
+
+   With delta=True, rxque items are DeltaItems rather than EventItems, each
+   with a sequence number, and with the snapshot of only the changed vector,
+   or for events concerning a whole device, the device snapshot, and for
+   other events, None. A "snapshot" request on txque returns a DeltaItem
+   with the requested snapshot, and the sequence number of the last change
+   it includes, so a consumer holding a full snapshot need only apply the
+   DeltaItems which follow it, with higher sequence numbers.
+
+   With subscribe given, an iterable of (devicepattern, vectorpattern) glob
+   patterns, or devicepattern strings subscribing to all vectors of matching
+   devices, only events of matching devices and vectors, and client events
+   such as connection and client messages, are set into rxque. Others are
+   not snapshotted or queued. Where the device patterns are all exact names,
+   the getProperties requests sent by the client are sent for each of these
+   devices only, so definitions of other devices are not received, and the
+   client then ignores their set vectors rather than parsing them into its
+   data. If any device pattern has wildcards, a getProperties for all
+   devices is sent as normal.
+
+   Run as a script, this connects to simpledriver.py, and prints whether
+   the snapshot of each vector is shared with the previous event snapshot."""
+
+
+import asyncio, collections, queue, threading, time
+
+from fnmatch import fnmatchcase
+
+from types import MappingProxyType
+
+from indipyclient.ipyclient import Snap, SnapDevice
+from indipyclient.queclient import QueClient
+
+
+DeltaItem = collections.namedtuple('DeltaItem', ['seq', 'eventtype', 'devicename', 'vectorname', 'timestamp', 'snapshot'])
+
+
+# the changed vectors of a device, used when the whole device has changed
+_ALLVECTORS = None
+
+
+class SharedQueClient(QueClient):
+
+    """As QueClient, but with snapshot() returning a snapshot sharing
+       unchanged device and vector snapshots with the previous one."""
+
+    def __init__(self, txque, rxque, indihost="localhost", indiport=7624, blobfolder=None, delta=False, subscribe=None):
+        """As QueClient, if delta is True, DeltaItems are set into rxque rather than EventItems.
+           If subscribe is given, only events of subscribed devices and vectors are set into rxque"""
+        super().__init__(txque, rxque, indihost, indiport, blobfolder)
+        self.delta = delta
+        # list of (devicepattern, vectorpattern), empty if everything is subscribed
+        self.subscriptions = []
+        if subscribe:
+            for pattern in subscribe:
+                if isinstance(pattern, str):
+                    self.subscriptions.append((pattern, "*"))
+                else:
+                    self.subscriptions.append((pattern[0], pattern[1] or "*"))
+        # (devicename, vectorname) to True if subscribed, saves matching patterns for every event
+        self._subscribed = {}
+        # device names to send getProperties to, or None to send one for all devices
+        self._getdevices = None
+        devicepatterns = [devicepattern for devicepattern, vectorpattern in self.subscriptions]
+        if devicepatterns and not any(c in pattern for pattern in devicepatterns for c in "*?["):
+            self._getdevices = list(dict.fromkeys(devicepatterns))
+        # the sequence number of the last DeltaItem
+        self._seq = 0
+        # the last snapshot taken
+        self._shared = None
+        # devicename to set of changed vectornames, or _ALLVECTORS
+        self._changed = {}
+        # True if the next snapshot should be a full copy
+        self._invalid = True
+
+
+    def subscribed(self, devicename, vectorname=None):
+        """Returns True if the device, or if vectorname is given, the vector,
+           is subscribed to"""
+        if not self.subscriptions:
+            return True
+        key = (devicename, vectorname)
+        result = self._subscribed.get(key)
+        if result is None:
+            if vectorname:
+                result = any(fnmatchcase(devicename, devicepattern) and fnmatchcase(vectorname, vectorpattern)
+                             for devicepattern, vectorpattern in self.subscriptions)
+            else:
+                result = any(fnmatchcase(devicename, devicepattern) for devicepattern, vectorpattern in self.subscriptions)
+            self._subscribed[key] = result
+        return result
+
+
+    async def send_getProperties(self, devicename=None, vectorname=None):
+        """As IPyClient.send_getProperties, but if devicename is not given, and the
+           subscribed device patterns are exact names, a getProperties is sent for
+           each subscribed device rather than for all devices"""
+        if devicename or self._getdevices is None:
+            await super().send_getProperties(devicename, vectorname)
+            return
+        for name in self._getdevices:
+            await super().send_getProperties(name)
+
+
+    def invalidate(self):
+        "Causes the next snapshot to be a full copy"
+        self._invalid = True
+
+
+    def _setchanged(self, eventtype, devicename, vectorname):
+        "Record the vectors changed by this event"
+        if eventtype in ("ConnectionMade", "ConnectionLost"):
+            # the client is cleared on connection events
+            self._invalid = True
+        elif not devicename:
+            # client messages and getProperties are not held in device snapshots
+            if eventtype not in ("Message", "getProperties"):
+                self._invalid = True
+        elif vectorname:
+            vectornames = self._changed.setdefault(devicename, set())
+            if vectornames is not _ALLVECTORS:
+                vectornames.add(vectorname)
+        elif eventtype == "Message":
+            # only the device messages have changed, a new device snapshot is
+            # needed, but its vector snapshots can be shared
+            self._changed.setdefault(devicename, set())
+        else:
+            # a device delete, or unknown event
+            self._changed[devicename] = _ALLVECTORS
+
+
+    def snapshot(self):
+        """Returns a snapshot of the client, sharing unchanged device and vector
+           snapshots with the previous snapshot. This should be treated as read only."""
+        previous = None if self._invalid else self._shared
+        changed = self._changed
+        self._changed = {}
+        self._invalid = False
+        snap = Snap(self.indihost, self.indiport, self.connected, self.messages, self.user_string)
+        if previous is None:
+            devices = {devicename:self._snapdevice(device, None, _ALLVECTORS) for devicename, device in self.data.items()}
+        else:
+            # copy the previous mapping, and replace the changed devices
+            devices = previous.data.copy()
+            for devicename, vectornames in changed.items():
+                device = self.data.get(devicename)
+                if device is None:
+                    devices.pop(devicename, None)
+                else:
+                    devices[devicename] = self._snapdevice(device, devices.get(devicename), vectornames)
+        snap.data = MappingProxyType(devices)
+        self._shared = snap
+        return snap
+
+
+    def _snapdevice(self, device, previous, vectornames):
+        """Returns a new device snapshot, sharing the vector snapshots of previous
+           other than those in vectornames"""
+        snapdevice = SnapDevice(device.devicename, device.messages, device.user_string, device.itemid)
+        if previous is None or vectornames is _ALLVECTORS:
+            vectors = {vectorname:self._snapvector(vector) for vectorname, vector in device.data.items()}
+        else:
+            vectors = previous.data.copy()
+            for vectorname in vectornames:
+                vector = device.data.get(vectorname)
+                if vector is None:
+                    vectors.pop(vectorname, None)
+                else:
+                    vectors[vectorname] = self._snapvector(vector)
+        snapdevice.data = MappingProxyType(vectors)
+        return snapdevice
+
+
+    def _snapvector(self, vector):
+        "Returns a new vector snapshot"
+        snapvector = vector.snapshot()
+        snapvector.data = MappingProxyType(snapvector.data)
+        return snapvector
+
+
+    def _deltasnapshot(self, devicename, vectorname):
+        "Returns the snapshot of the vector or device changed by an event, or None"
+        device = self.data.get(devicename) if devicename else None
+        if device is None:
+            return
+        if vectorname:
+            vector = device.data.get(vectorname)
+            if vector is not None:
+                return self._snapvector(vector)
+            return
+        return self._snapdevice(device, None, _ALLVECTORS)
+
+
+    async def _set_rxque_item(self, eventtype, devicename, vectorname, timestamp):
+        """Records the vectors changed by the event, and then if subscribed, adds an
+           EventItem to rxque, or if self.delta is True, a DeltaItem"""
+        if eventtype != "snapshot":
+            self._setchanged(eventtype, devicename, vectorname)
+            if devicename and not self.subscribed(devicename, vectorname):
+                return
+        if not self.delta:
+            await super()._set_rxque_item(eventtype, devicename, vectorname, timestamp)
+            return
+        if eventtype == "snapshot":
+            snapshot = self.snapshot()
+            # a request for an unknown device or vector returns None
+            if devicename:
+                snapshot = snapshot.get(devicename)
+                if vectorname and snapshot is not None:
+                    snapshot = snapshot.get(vectorname)
+            item = DeltaItem(self._seq, "snapshot", devicename, vectorname, None, snapshot)
+        else:
+            self._seq += 1
+            item = DeltaItem(self._seq, eventtype, devicename, vectorname, timestamp, self._deltasnapshot(devicename, vectorname))
+        await self._putrxque(item)
+
+
+    async def _putrxque(self, item):
+        "Adds item to rxque, as the QueClient _set_rxque_item method"
+        rxque = self.clientdata['rxque']
+        if isinstance(rxque, queue.Queue):
+            while not self._stop:
+                try:
+                    rxque.put_nowait(item)
+                except queue.Full:
+                    await asyncio.sleep(0.02)
+                else:
+                    break
+        elif isinstance(rxque, asyncio.Queue):
+            while not self._stop:
+                try:
+                    await asyncio.wait_for(rxque.put(item), 0.1)
+                except asyncio.TimeoutError:
+                    continue
+                else:
+                    break
+        elif isinstance(rxque, collections.deque):
+            rxque.append(item)
+        else:
+            raise TypeError("rxque should be either a queue.Queue, asyncio.Queue, or collections.deque")
+
+
+def runsharedqueclient(txque, rxque, indihost="localhost", indiport=7624, blobfolder=None, delta=False, subscribe=None):
+    """Blocking call which creates a SharedQueClient object and runs its asyncrun method,
+       as runqueclient of indipyclient.queclient"""
+    client = SharedQueClient(txque, rxque, indihost, indiport, blobfolder, delta, subscribe)
+    asyncio.run(client.asyncrun())
+
+
+def printshared(rxque):
+    """Print each event, and the vectors whose snapshots are shared
+       with the previous event. Use CTRL-C to stop"""
+    previous = {}
+    while True:
+        try:
+            event = rxque.popleft()
+        except IndexError:
+            time.sleep(0.1)
+            continue
+        shared = []
+        for devicename, snapdevice in event.snapshot.items():
+            for vectorname, snapvector in snapdevice.items():
+                if previous.get((devicename, vectorname)) is snapvector:
+                    shared.append(vectorname)
+                previous[devicename, vectorname] = snapvector
+        print(event.eventtype, event.devicename, event.vectorname, "shared:", shared)
+
+
+if __name__ == "__main__":
+
+    txque = collections.deque()
+    rxque = collections.deque()
+
+    clientthread = threading.Thread(target=runsharedqueclient, args=(txque, rxque))
+    clientthread.start()
+
+    print(f"Running {__file__}")
+
+    try:
+        printshared(rxque)
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        txque.append(None)
+        clientthread.join()
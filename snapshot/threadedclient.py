@@ -7,7 +7,10 @@
 
 import asyncio, collections, threading, time
 
-from indipyclient.queclient import runqueclient
+# SharedQueClient snapshots share unchanged parts with the previous
+# snapshot, rather than copying the whole client state for every event.
+# This imports sharedqueclient.py, and assumes it is in the same directory.
+from sharedqueclient import runsharedqueclient
 
 
 
@@ -21,12 +24,15 @@ def numberdoubler(txque, rxque):
             time.sleep(0.1)
             continue
         print(event.eventtype)
-        if event.devicename != 'Counter' or event.vectorname != 'txcount':
+        # only Counter txcount is subscribed, so other events
+        # are client events such as connection and messages
+        if event.vectorname != 'txcount':
             continue
         try:
-            # get the value sent by the driver, available in the snapshot
-            value = float(event.snapshot['Counter']['txcount']['txvalue'])
-        except (IndexError, KeyError):
+            # get the value sent by the driver, available in the
+            # snapshot, which in delta mode is that of the txcount vector
+            value = float(event.snapshot['txvalue'])
+        except (IndexError, KeyError, TypeError):
             continue
         # manipulate it, in this example just multiply by two
         # and transmit manipulated value back in vector rxvector
@@ -40,8 +46,13 @@ if __name__ == "__main__":
     # create queue where client will put events
     rxque = collections.deque()
 
-    # run a queclient in its own thread
-    clientthread = threading.Thread(target=runqueclient, args=(txque, rxque))
+    # run a sharedqueclient in its own thread, with delta set True
+    # so each event carries only the snapshot of the changed vector,
+    # and subscribing to txcount only, so events of other vectors
+    # and devices are not queued
+    clientthread = threading.Thread(target=runsharedqueclient,
+                                    args=(txque, rxque),
+                                    kwargs={"delta":True, "subscribe":[("Counter", "txcount")]})
 
     # The args argument could also have hostname and port specified
     # if the server is running elsewhere